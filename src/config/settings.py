@@ -24,6 +24,8 @@ class Settings(BaseSettings):
     GEMINI_BASE_URL: str = "https://generativelanguage.googleapis.com"
     GEMINI_TEMPERATURE: float = 0.7
     GEMINI_MAX_TOKENS: int = 5000
+    GEMINI_RPM: int = 10  # Requests per minute across all invoice processors
+    GEMINI_MAX_CONCURRENCY: int = 5  # Requests in flight at once across all processors
 
     # Logging Configuration
     LOG_LEVEL: str = "DEBUG"
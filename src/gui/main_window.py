@@ -93,9 +93,11 @@ class ProcessingWorker(QThread):
 
             try:
                 # Run the async processing
+                # Uploading an image again is how users retry a recognition,
+                # so always ask the model instead of reusing a cached answer
                 result = loop.run_until_complete(
                     self.processor.process_invoice(
-                        self.file_path, self.category)
+                        self.file_path, self.category, use_cache=False)
                 )
 
                 # Emit the result
@@ -1,9 +1,49 @@
-from typing import Dict, Any, List, cast
-from threading import RLock
+from typing import Dict, Any, List, Optional, Tuple, cast
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from threading import Lock, RLock
+import math
+import os
+import posixpath
+import re
+import sys
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
 import openpyxl
+from openpyxl.utils import get_column_letter
+from openpyxl.workbook.workbook import Workbook
+from openpyxl.worksheet.worksheet import Worksheet
 from src.utils.logger import logger
 from pathlib import Path
 
+# Multiplier packing (row, column) into one int key; larger than Excel's max column count
+_CELL_KEY_STRIDE = 1 << 15
+
+# Zero-based index of every column letter from A to ZZ
+_COL_INDEX = {get_column_letter(n): n - 1 for n in range(1, 703)}
+
+# OOXML namespaces used to map sheet names to their worksheet parts
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_CALC_PR_RE = re.compile(r'<calcPr\b([^>]*?)(/?)>')
+_FULL_CALC_ATTR_RE = re.compile(r'\bfullCalcOnLoad="[^"]*"')
+_STYLE_ATTR_RE = re.compile(r'\bs="(\d+)"')
+
+
+def _apply_updates_worker(path: Path, updates: List[Dict[str, Any]]) -> None:
+    """
+    Process pool entry point: apply updates to one workbook and save it.
+
+    Args:
+        path: Path of the workbook
+        updates: Update instructions for this workbook
+    """
+    updater = ExcelUpdater(path)
+    updater.apply_updates(updates)
+    updater.save_workbook()
+
 
 class ExcelUpdater:
     """
@@ -15,10 +55,40 @@ class ExcelUpdater:
     2. Row/column based updates
     3. Date based updates in specific sheets
 
-    All operations are protected by a global lock to ensure thread safety.
+    All operations are protected by a per-file lock, so updaters working on
+    different workbooks never block each other while updaters sharing the same
+    file are still serialized.
     """
 
-    _global_lock = RLock()  # Class-level lock for all ExcelUpdater instances
+    _path_locks: Dict[Path, RLock] = {}  # One lock per workbook path
+    _path_locks_guard = Lock()  # Short-held lock protecting _path_locks
+
+    _save_executor: Optional[ThreadPoolExecutor] = None  # Lazily created on first async save
+    _save_executor_lock = Lock()
+    _pending_saves: List[Future] = []
+    _save_workers = 2
+
+    # Pool of loaded workbooks per file, each tagged with the file stamp it matches
+    _wb_pool: Dict[Path, List[Tuple[Tuple[int, int], Workbook]]] = {}
+    _pool_lock = Lock()
+
+    @classmethod
+    def _lock_for(cls, path: Path) -> RLock:
+        """
+        Get the lock guarding the workbook at the given path.
+
+        Args:
+            path: Path of the workbook
+
+        Returns:
+            Re-entrant lock shared by all instances operating on the same file
+        """
+        key = Path(path).resolve()
+        with cls._path_locks_guard:
+            lock = cls._path_locks.get(key)
+            if lock is None:
+                lock = cls._path_locks[key] = RLock()
+            return lock
 
     def __init__(self, output_path: Path):
         """
@@ -31,44 +101,214 @@ class ExcelUpdater:
             FileNotFoundError: If the workbook doesn't exist
             openpyxl.utils.exceptions.InvalidFileException: If the file is not a valid Excel file
         """
-        self.workbook = openpyxl.load_workbook(output_path)
-        self.output_path = output_path
+        self.open_workbook(output_path)
 
     def open_workbook(self, output_path: Path) -> None:
         """
         Open the workbook from the specified path.
+
+        A pooled workbook released by an earlier updater is reused when the
+        file has not changed on disk since; otherwise the file is loaded.
         """
-        self.workbook = openpyxl.load_workbook(output_path)
+        self._lock = self._lock_for(output_path)
+        # The whole workbook is loaded on purpose: openpyxl rewrites the complete
+        # package on save, so any sheet skipped here would be dropped from the file
+        self.workbook, self._disk_stamp = self._acquire_workbook(output_path)
         self.output_path = output_path
+        self._clean = True  # In-memory workbook matches the file on disk
+        self._save_futures: List[Future] = []  # Background saves of this updater
+
+    @staticmethod
+    def _file_stamp(path: Path) -> Tuple[int, int]:
+        """Return (mtime_ns, size) identifying the current content of a file."""
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
 
-    def save_workbook(self) -> None:
+    @classmethod
+    def _acquire_workbook(cls, path: Path) -> Tuple[Workbook, Tuple[int, int]]:
         """
-        Save the workbook to the specified output path.
-        Thread-safe operation using the global lock.
+        Take a pooled workbook for the path, or load it from disk.
 
-        Raises:
-            PermissionError: If the file is locked or permission denied
-            Exception: For other IO related errors
+        Pooled workbooks whose file has been modified since they were released
+        are discarded.
+
+        Args:
+            path: Path of the workbook
+
+        Returns:
+            Tuple of (workbook, file stamp the workbook matches)
+        """
+        key = Path(path).resolve()
+        stamp = cls._file_stamp(path)
+        with cls._pool_lock:
+            pooled = cls._wb_pool.get(key, [])
+            while pooled:
+                pooled_stamp, workbook = pooled.pop()
+                if pooled_stamp == stamp:
+                    return workbook, stamp
+        return openpyxl.load_workbook(path), stamp
+
+    @classmethod
+    def prefill(cls, paths: List[Path], count: int = 1) -> None:
+        """
+        Warm the workbook pool by loading workbooks ahead of time.
+
+        Args:
+            paths: Workbook paths to load
+            count: Number of workbooks to pool per path
+        """
+        for path in paths:
+            key = Path(path).resolve()
+            for _ in range(count):
+                stamp = cls._file_stamp(path)
+                workbook = openpyxl.load_workbook(path)
+                with cls._pool_lock:
+                    cls._wb_pool.setdefault(key, []).append((stamp, workbook))
+
+    def release(self) -> None:
+        """
+        Return the workbook to the pool for reuse by later updaters on the same file.
+
+        Only workbooks that match the file on disk (freshly loaded or saved,
+        with no failed or unsaved updates since) are pooled; anything else is
+        dropped so the next updater reloads from disk. Background saves of
+        this updater are waited for first, so they still see the workbook.
+        The updater must not be used after release.
+        """
+        # Outside the lock: the saves need it to run
+        wait(self._save_futures)
+        self._save_futures = []
+        with self._lock:
+            workbook, self.workbook = self.workbook, None
+            if workbook is None or not self._clean:
+                return
+            with ExcelUpdater._pool_lock:
+                ExcelUpdater._wb_pool.setdefault(
+                    Path(self.output_path).resolve(), []).append((self._disk_stamp, workbook))
+
+    @classmethod
+    def _get_save_executor(cls) -> ThreadPoolExecutor:
         """
+        Get the shared executor used for background saves, creating it on first use.
+
+        Returns:
+            Thread pool running asynchronous save_workbook calls
+        """
+        with cls._save_executor_lock:
+            if cls._save_executor is None:
+                cls._save_executor = ThreadPoolExecutor(
+                    max_workers=cls._save_workers, thread_name_prefix="excel-save")
+            return cls._save_executor
+
+    def _save(self) -> None:
+        """Save the workbook to the output path while holding the per-file lock."""
         try:
-            with ExcelUpdater._global_lock:
+            with self._lock:
                 self.workbook.save(self.output_path)
+                self._disk_stamp = self._file_stamp(self.output_path)
+                self._clean = True
                 logger.info(
                     f"Successfully saved workbook to: {self.output_path}")
         except Exception as e:
             logger.error(f"Error saving workbook: {str(e)}")
             raise
 
+    def save_workbook(self, async_: bool = False) -> Optional[Future]:
+        """
+        Save the workbook to the specified output path.
+        Thread-safe operation using the per-file lock.
+
+        By default the save runs synchronously. Batch pipelines can pass
+        async_=True to serialize the workbook on a background thread while the
+        caller moves on; call wait_all_saves() before exiting.
+
+        Args:
+            async_: Run the save on the shared background executor
+
+        Returns:
+            Future of the background save when async_ is True, otherwise None
+
+        Raises:
+            PermissionError: If the file is locked or permission denied
+            Exception: For other IO related errors
+        """
+        if not async_:
+            self._save()
+            return None
+
+        future = self._get_save_executor().submit(self._save)
+        self._save_futures = [f for f in self._save_futures if not f.done()]
+        self._save_futures.append(future)
+        with ExcelUpdater._save_executor_lock:
+            ExcelUpdater._pending_saves = [
+                f for f in ExcelUpdater._pending_saves if not f.done()]
+            ExcelUpdater._pending_saves.append(future)
+        return future
+
+    @classmethod
+    def wait_all_saves(cls) -> None:
+        """
+        Block until all pending background saves have finished.
+
+        Raises:
+            Exception: The first error raised by any of the pending saves
+        """
+        with cls._save_executor_lock:
+            pending, cls._pending_saves = cls._pending_saves, []
+        wait(pending)
+        for future in pending:
+            future.result()
+
+    @classmethod
+    def apply_many(cls, file_updates: Dict[Path, List[Dict[str, Any]]],
+                   max_workers: Optional[int] = None) -> None:
+        """
+        Apply and save updates for several independent workbooks in parallel processes.
+
+        Loading and saving with openpyxl is CPU bound, so separate files are
+        dispatched to a process pool and scale with the number of cores.
+        Entries resolving to the same file are merged and handled by a single
+        worker, keeping same-file updates serialized.
+
+        Args:
+            file_updates: Mapping of workbook path to its update instructions
+            max_workers: Number of worker processes (defaults to the CPU count)
+
+        Raises:
+            Exception: The first error raised by any of the workers
+        """
+        merged: Dict[Path, List[Dict[str, Any]]] = {}
+        for path, updates in file_updates.items():
+            merged.setdefault(Path(path).resolve(), []).extend(updates)
+        if not merged:
+            return
+
+        workers = min(max_workers or os.cpu_count() or 1, len(merged))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_apply_updates_worker, path, updates): path
+                for path, updates in merged.items()
+            }
+            error: Optional[Exception] = None
+            for future, path in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error updating workbook {path}: {str(e)}")
+                    error = error or e
+        if error is not None:
+            raise error
+
     def close_workbook(self) -> None:
         """
         Close the workbook.
-        Thread-safe operation using the global lock.
+        Thread-safe operation using the per-file lock.
 
         Raises:
             Exception: If there's an error closing the workbook
         """
         try:
-            with ExcelUpdater._global_lock:
+            with self._lock:
                 self.workbook.close()
                 logger.info("Successfully closed workbook")
         except Exception as e:
@@ -127,80 +367,41 @@ class ExcelUpdater:
             Exception: For other update related errors
         """
         try:
-            with ExcelUpdater._global_lock:
-                # Track accumulated cell values for same-cell updates
-                accumulated_values = {}
-
+            with self._lock:
+                # Cleared until the next successful save; a failure below leaves the
+                # workbook partially updated, so it must not be pooled either way
+                self._clean = False
+
+                # Validate everything and bucket updates by schema up front, so each
+                # kind is then applied by a tight loop without per-update dispatch
+                section_ups: Dict[str, List[Dict[str, Any]]] = {}
+                rc_ups: Dict[str, List[Dict[str, Any]]] = {}
+                date_ups: Dict[str, List[Dict[str, Any]]] = {}
                 for update in updates:
-                    # Validate update format
                     self._validate_update(update)
-
                     sheet_name = update['sheet']
-                    sheet = self.workbook[sheet_name]
-
                     if sheet_name in ('调价前', '调价后'):
                         if 'section' in update:
-                            target_section = update['section']
-                            if target_section in ['A', 'B', 'C']:
-                                current_section = None
-                                # Handle product name based updates
-                                for row in sheet.iter_rows(min_row=3):
-                                    if row[0].value is not None:
-                                        current_section = cast(str,row[0].value).strip()
-                                    if current_section == target_section:
-                                        # B column data
-                                        product_name = cast(str,row[1].value)
-                                        if not product_name:  # Skip empty rows
-                                            continue
-                                        # Normalize both product names before comparison
-                                        normalized_row_name = self._normalize_product_name(
-                                            product_name)
-                                        normalized_update_name = self._normalize_product_name(
-                                            update['product_name'])
-                                        if normalized_row_name == normalized_update_name:
-                                            col_idx = self._get_column_index(
-                                                update['column'])
-                                            row[col_idx].value = update['value']
-                                            break
-
+                            if update['section'] in ('A', 'B', 'C'):
+                                section_ups.setdefault(sheet_name, []).append(update)
                         elif 'updates' in update:
-                            # Handle row/column based updates
-                            for row_update in update['updates']:
-                                row_idx = row_update['row'] - 1
-                                col_idx = self._get_column_index(
-                                    row_update['column'])
-                                cell_key = (sheet_name, row_idx + 1, col_idx + 1)
-
-                                if cell_key not in accumulated_values:
-                                    accumulated_values[cell_key] = 0
-                                    # Clear existing value when first encountering this cell
-                                    sheet.cell(
-                                        row=row_idx + 1, column=col_idx + 1).value = None
-
-                                # Accumulate the new value
-                                accumulated_values[cell_key] += row_update['value']
-                                # Update the cell with accumulated value
-                                sheet.cell(
-                                    row=row_idx + 1, column=col_idx + 1).value = round(accumulated_values[cell_key], 2)
-
+                            rc_ups.setdefault(sheet_name, []).extend(update['updates'])
                     elif sheet_name == '油品优惠明细 2':
-                        # Handle date based updates
-                        date = update.get('date')
-                        date_found = False
-
-                        # Find the row corresponding to the date
-                        for row_idx, row in enumerate(sheet.iter_rows(min_row=2), start=2):
-                            if row[1].value == date:  # B column is date
-                                date_found = True
-                                for col_update in update['updates']:
-                                    col_idx = self._get_column_index(
-                                        col_update['column'])
-                                    row[col_idx].value = col_update['value']
-                                break
-
-                        if not date_found:
-                            logger.warning(
-                                f"Date {date} not found in sheet {sheet_name}")
+                        date_ups.setdefault(sheet_name, []).append(update)
+
+                for sheet_name, sheet_updates in section_ups.items():
+                    self._apply_section_updates(sheet_name, sheet_updates)
+
+                for sheet_name, row_updates in rc_ups.items():
+                    self._apply_cell_updates(
+                        self.workbook[sheet_name],
+                        [u['row'] for u in row_updates],
+                        [self._get_column_index(u['column']) + 1 for u in row_updates],
+                        [u['value'] for u in row_updates],
+                    )
+
+                for sheet_name, sheet_updates in date_ups.items():
+                    self._apply_date_updates(sheet_name, sheet_updates)
 
                 logger.info("Successfully applied updates to workbook")
 
@@ -208,6 +409,313 @@ class ExcelUpdater:
             logger.error(f"Error applying updates: {str(e)}")
             raise
 
+    @classmethod
+    def apply_updates_fast(cls, output_path: Path, updates: List[Dict[str, Any]]) -> None:
+        """
+        Apply updates by patching the worksheet XML inside the xlsx file directly.
+
+        Small row/column update sets only touch a handful of cells, so instead of
+        loading and re-serializing the whole workbook, the affected <c> elements
+        are rewritten in place and every other zip member is copied verbatim.
+        Excel is asked to recalculate formulas on open, as it is after an
+        openpyxl save.
+
+        Falls back to the regular openpyxl load/apply/save path when an update
+        is not row/column based or a touched cell cannot be patched safely
+        (missing cell, inline string or formula).
+
+        Args:
+            output_path: Path of the workbook to update in place
+            updates: Update instructions in the format accepted by apply_updates
+        """
+        output_path = Path(output_path)
+        with cls._lock_for(output_path):
+            cell_values = cls._collect_cell_values(updates)
+            if cell_values is not None and cls._patch_cells(output_path, cell_values):
+                logger.info(
+                    f"Successfully patched workbook cells in: {output_path}")
+                return
+
+            logger.info("Falling back to full workbook update")
+            updater = cls(output_path)
+            updater.apply_updates(updates)
+            updater.save_workbook()
+
+    @staticmethod
+    def _collect_cell_values(updates: List[Dict[str, Any]]) -> Optional[Dict[str, Dict[str, float]]]:
+        """
+        Accumulate row/column updates into final values per sheet and cell reference.
+
+        Args:
+            updates: Update instructions
+
+        Returns:
+            Mapping of sheet name to {cell reference: value}, or None if any
+            update is not a well-formed row/column update
+        """
+        cell_values: Dict[str, Dict[str, float]] = {}
+        for update in updates:
+            if update.get('sheet') not in ('调价前', '调价后') or 'updates' not in update \
+                    or 'section' in update:
+                return None
+            sheet_values = cell_values.setdefault(update['sheet'], {})
+            for row_update in update['updates']:
+                if not all(key in row_update for key in ['row', 'column', 'value']):
+                    return None
+                ref = f"{row_update['column'].upper()}{row_update['row']}"
+                sheet_values[ref] = sheet_values.get(ref, 0) + row_update['value']
+        return cell_values
+
+    @staticmethod
+    def _sheet_parts(archive: zipfile.ZipFile) -> Dict[str, str]:
+        """
+        Map sheet names to worksheet part names inside the xlsx archive.
+
+        Args:
+            archive: Open xlsx archive
+
+        Returns:
+            Mapping of sheet name to zip member name (e.g. 'xl/worksheets/sheet1.xml')
+        """
+        rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {}
+        for rel in rels.iter(f'{_NS_PKG_REL}Relationship'):
+            target = rel.get('Target', '')
+            targets[rel.get('Id')] = target.lstrip('/') if target.startswith('/') \
+                else posixpath.normpath(posixpath.join('xl', target))
+
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        return {
+            sheet.get('name'): targets[sheet.get(f'{_NS_REL}id')]
+            for sheet in workbook.iter(f'{_NS_MAIN}sheet')
+            if sheet.get(f'{_NS_REL}id') in targets
+        }
+
+    @staticmethod
+    def _patch_cell(sheet_xml: str, ref: str, value: float) -> Optional[str]:
+        """
+        Replace the value of a single existing cell in worksheet XML.
+
+        Args:
+            sheet_xml: Worksheet XML text
+            ref: Cell reference (e.g. 'E81')
+            value: Numeric value to write
+
+        Returns:
+            Patched XML, or None if the cell is missing or holds an inline
+            string or formula
+
+        Raises:
+            ValueError: If the value is not a finite number
+        """
+        # numpy scalars repr as 'np.float64(...)', so format a plain float;
+        # whole numbers are written without '.0', as openpyxl writes ints
+        number = float(round(value, 2))
+        if not math.isfinite(number):
+            raise ValueError(f"Cannot write non-finite value {value!r} to cell {ref}")
+        text = str(int(number)) if number.is_integer() else repr(number)
+
+        match = re.search(
+            rf'<c\b([^>]*?\br="{ref}"[^>]*?)(?:/>|>(.*?)</c>)', sheet_xml, re.S)
+        if match is None:
+            return None
+        attrs, body = match.group(1), match.group(2) or ''
+        if 't="inlineStr"' in attrs or '<f' in body or '<is' in body:
+            return None
+
+        style = _STYLE_ATTR_RE.search(attrs)
+        style_attr = f' s="{style.group(1)}"' if style else ''
+        cell = f'<c r="{ref}"{style_attr}><v>{text}</v></c>'
+        return sheet_xml[:match.start()] + cell + sheet_xml[match.end():]
+
+    @classmethod
+    def _patch_cells(cls, output_path: Path, cell_values: Dict[str, Dict[str, float]]) -> bool:
+        """
+        Rewrite the given cells in the xlsx file, copying untouched members verbatim.
+
+        Args:
+            output_path: Path of the workbook to patch
+            cell_values: Mapping of sheet name to {cell reference: value}
+
+        Returns:
+            True if the file was patched, False if the caller must fall back
+        """
+        patched: Dict[str, bytes] = {}
+        tmp_name = None
+        try:
+            with zipfile.ZipFile(output_path) as archive:
+                sheet_parts = cls._sheet_parts(archive)
+                for sheet_name, values in cell_values.items():
+                    part = sheet_parts.get(sheet_name)
+                    if part is None:
+                        return False
+                    sheet_xml: Optional[str] = archive.read(part).decode('utf-8')
+                    for ref, value in values.items():
+                        sheet_xml = cls._patch_cell(cast(str, sheet_xml), ref, value)
+                        if sheet_xml is None:
+                            return False
+                    patched[part] = cast(str, sheet_xml).encode('utf-8')
+
+                # Make Excel recompute formulas depending on the patched cells
+                workbook_xml = archive.read('xl/workbook.xml').decode('utf-8')
+                calc_pr = _CALC_PR_RE.search(workbook_xml)
+                if calc_pr is None:
+                    return False
+                attrs = _FULL_CALC_ATTR_RE.sub('', calc_pr.group(1)).rstrip()
+                workbook_xml = workbook_xml[:calc_pr.start()] + \
+                    f'<calcPr{attrs} fullCalcOnLoad="1"{calc_pr.group(2)}>' + \
+                    workbook_xml[calc_pr.end():]
+                patched['xl/workbook.xml'] = workbook_xml.encode('utf-8')
+
+                fd, tmp_name = tempfile.mkstemp(
+                    suffix='.xlsx', dir=output_path.parent)
+                os.close(fd)
+                with zipfile.ZipFile(tmp_name, 'w', zipfile.ZIP_DEFLATED) as target:
+                    for info in archive.infolist():
+                        data = patched.get(info.filename)
+                        target.writestr(
+                            info, data if data is not None else archive.read(info))
+
+            os.replace(tmp_name, output_path)
+            tmp_name = None
+            return True
+
+        except (KeyError, ET.ParseError, UnicodeDecodeError) as e:
+            logger.warning(f"Cannot patch workbook cells directly: {str(e)}")
+            return False
+        finally:
+            if tmp_name is not None and os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    @classmethod
+    def _index_section_rows(cls, sheet: Worksheet) -> Dict[Tuple[str, str], int]:
+        """
+        Build the (section, normalized product name) -> row index for a sheet.
+
+        Column A carries the section (A/B/C) on the first row of each section
+        and column B the product name (油枪序号); data starts at row 3. The
+        first matching row wins, as in a top-down scan.
+
+        Args:
+            sheet: Loaded worksheet to index
+
+        Returns:
+            Mapping of (section, normalized product name) to one-based row index
+        """
+        rows: Dict[Tuple[str, str], int] = {}
+        current_section = None
+        for row_idx, (section, product_name) in enumerate(
+                sheet.iter_rows(min_row=3, max_col=2, values_only=True), start=3):
+            if section is not None:
+                current_section = str(section).strip()
+            if current_section is None or not product_name:  # Skip empty rows
+                continue
+            rows.setdefault(
+                (current_section, cls._normalize_product_name(product_name)), row_idx)
+        return rows
+
+    @staticmethod
+    def _index_date_rows(sheet: Worksheet) -> Dict[Any, int]:
+        """
+        Build the date -> row index for a sheet whose column B holds the day.
+
+        Args:
+            sheet: Loaded worksheet to index
+
+        Returns:
+            Mapping of column B value to the first one-based row index holding it
+        """
+        rows: Dict[Any, int] = {}
+        for row_idx, (_, date) in enumerate(
+                sheet.iter_rows(min_row=2, max_col=2, values_only=True), start=2):
+            if date is not None:
+                rows.setdefault(date, row_idx)
+        return rows
+
+    def _apply_section_updates(self, sheet_name: str, updates: List[Dict[str, Any]]) -> None:
+        """
+        Apply product name based updates of one sheet via the (section, name) row index.
+
+        Args:
+            sheet_name: Name of the sheet ('调价前' or '调价后')
+            updates: Updates with section, product_name, column and value
+        """
+        sheet = self.workbook[sheet_name]
+        rows = self._index_section_rows(sheet)
+        for update in updates:
+            row_idx = rows.get(
+                (update['section'], self._normalize_product_name(update['product_name'])))
+            if row_idx is not None:
+                self._set_cell_value(
+                    sheet, row_idx, self._get_column_index(update['column']) + 1, update['value'])
+
+    def _apply_cell_updates(self, sheet: Worksheet, rows: List[int], columns: List[int],
+                            values: List[float]) -> None:
+        """
+        Apply row/column based updates given as parallel lists.
+
+        Values for the same cell are summed (e.g. handling fees from several
+        channels in 调价前!E81) and replace the existing value. Each cell is
+        written once, in row-major order.
+
+        Args:
+            sheet: Worksheet to update
+            rows: One-based row indexes
+            columns: One-based column indexes
+            values: Values to add to the cells
+        """
+        # Keyed by a flat row/column int; sorting the keys gives row-major order
+        accumulated: Dict[int, float] = {}
+        for row, column, value in zip(rows, columns, values):
+            cell_key = row * _CELL_KEY_STRIDE + column
+            accumulated[cell_key] = accumulated.get(cell_key, 0) + value
+
+        for cell_key in sorted(accumulated):
+            row, column = divmod(cell_key, _CELL_KEY_STRIDE)
+            self._set_cell_value(sheet, row, column, round(accumulated[cell_key], 2))
+
+    def _apply_date_updates(self, sheet_name: str, updates: List[Dict[str, Any]]) -> None:
+        """
+        Apply date based updates of one sheet via the date row index.
+
+        Args:
+            sheet_name: Name of the sheet ('油品优惠明细 2')
+            updates: Updates with date and a list of column/value updates
+        """
+        sheet = self.workbook[sheet_name]
+        rows = self._index_date_rows(sheet)
+        for update in updates:
+            date = update.get('date')
+            row_idx = rows.get(date)
+            if row_idx is None:
+                logger.warning(
+                    f"Date {date} not found in sheet {sheet_name}")
+                continue
+            for col_update in update['updates']:
+                self._set_cell_value(
+                    sheet, row_idx, self._get_column_index(col_update['column']) + 1, col_update['value'])
+
+    @staticmethod
+    def _set_cell_value(sheet: Worksheet, row: int, column: int, value: Any) -> None:
+        """
+        Write a value to a cell, looking up existing cells directly.
+
+        Existing cells are fetched straight from the worksheet's internal cell
+        map, skipping the bounds checks and keyword handling of sheet.cell().
+        Missing cells fall back to sheet.cell() so they are created properly.
+
+        Args:
+            sheet: Worksheet to write to
+            row: One-based row index
+            column: One-based column index
+            value: Value to write
+        """
+        cell = sheet._cells.get((row, column))
+        if cell is not None:
+            cell.value = value
+        else:
+            sheet.cell(row=row, column=column, value=value)
+
     def _get_column_index(self, column: str) -> int:
         """
         Convert Excel column letter(s) to zero-based index.
@@ -219,8 +727,12 @@ class ExcelUpdater:
         Returns:
             Zero-based column index
         """
+        column = column.upper()
+        index = _COL_INDEX.get(column)
+        if index is not None:
+            return index
         result = 0
-        for char in column.upper():
+        for char in column:
             result = result * 26 + (ord(char) - ord('A') + 1)
         return result - 1  # Convert to 0-based index
 
@@ -234,13 +746,13 @@ class ExcelUpdater:
             name: The product name to normalize
 
         Returns:
-            Normalized product name
+            Normalized product name, interned so index lookups compare by identity
         """
         if not name:
             return ""
-        # Convert to string and remove any whitespace
-        name_str = str(name).strip()
+        # Convert to string (skipped for str input); only strip when needed
+        name_str = name if type(name) is str else str(name)
+        if name_str and (name_str[0].isspace() or name_str[-1].isspace()):
+            name_str = name_str.strip()
         # Remove '号' suffix if present
-        if name_str.endswith('号'):
-            name_str = name_str[:-1]
-        return name_str
+        return sys.intern(name_str[:-1] if name_str.endswith('号') else name_str)
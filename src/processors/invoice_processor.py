@@ -1,18 +1,284 @@
-from typing import Dict, Any, Union
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
 import json
+import math
 import asyncio
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from io import BytesIO
 from pathlib import Path
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types
-from PIL import Image
+import httpx
+from PIL import ExifTags, Image, ImageOps
 from src.config.settings import get_settings
-from src.prompts.invoice_recognition import get_invoice_recognition_messages, get_category_schema, INVOICE_SYSTEM_PROMPT
+from src.prompts.invoice_recognition import get_invoice_recognition_messages, get_category_schema, get_missing_fields, INVOICE_SYSTEM_PROMPT
 from src.utils.logger import logger
 from src.config.shift_config import ShiftConfig
 from src.utils.value_parser import parse_numeric_value
 
 settings = get_settings()
 
+# Parsers specialized for the two units used on invoices
+parse_yuan = partial(parse_numeric_value, unit="元")
+parse_liter = partial(parse_numeric_value, unit="升")
+
+# (field, parser) pairs parsed from the recognition result of each category
+_HUOCHEBANG_FIELDS = (
+    ("柴油统计", parse_liter),
+    ("油站直降", parse_yuan),
+    ("油站折扣", parse_yuan),
+    ("服务费", parse_yuan),
+    ("结算金额", parse_yuan),
+)
+_DIDIJIA_FIELDS = (
+    ("油品数量", parse_numeric_value),
+    ("油品优惠合计", parse_numeric_value),
+    ("油品预收金额", parse_numeric_value),
+    ("油品应收金额", parse_numeric_value),
+)
+_GUOTONG_FIELDS = (
+    ("订单金额", parse_numeric_value),
+    ("退款订单金额", parse_numeric_value),
+)
+_TUANYOU_FIELDS = (
+    ("加油升数汇总", parse_liter),
+    ("通道费汇总", parse_yuan),
+    ("实际结算金额汇总", parse_yuan),
+    ("加油金额汇总", parse_yuan),
+)
+_DOUYIN_FIELDS = (
+    ("用户侧划线价合计", parse_numeric_value),
+    ("订单实收合计", parse_numeric_value),
+    ("预计收入合计", parse_numeric_value),
+)
+
+# Update templates: (sheet, ((row, column, value key), ...)) per category.
+# A row of None marks a cell located by the shift date instead of a fixed row.
+_HUOCHEBANG_UPDATES = (
+    ('调价前', ((81, 'E', 'handling_fee'), (90, 'C', 'settlement_amount'))),
+    ('油品优惠明细 2', ((None, 'AA', 'diesel_stats'), (None, 'AB', 'diesel_discount'))),
+)
+_DIDIJIA_UPDATES = (
+    ('调价前', ((81, 'E', 'handling_fee'), (88, 'C', 'settlement_amount'))),
+    ('油品优惠明细 2', ((None, 'P', 'gas_stats'), (None, 'Q', 'gas_discount'))),
+)
+_GUOTONG_UPDATES = {
+    "国通1": (('调价前', ((92, 'H', 'settlement_amount'),)),),
+    "国通2": (('调价前', ((93, 'H', 'settlement_amount'),)),),
+}
+_TUANYOU_UPDATES = (
+    ('调价前', ((81, 'E', 'handling_fee'), (89, 'C', 'settlement_amount'))),
+    ('油品优惠明细 2', ((None, 'W', 'gas_stats'), (None, 'X', 'gas_discount'))),
+)
+_POS_UPDATES = (('调价前', ((80, 'E', 'settlement_amount'),)),)
+_SUPERMARKET_UPDATES = (('调价前', ((71, 'H', 'settlement_amount'),)),)
+_DOUYIN_UPDATES = (
+    ('调价前', ((81, 'E', 'handling_fee'), (93, 'C', 'merchant_revenue'))),
+    ('油品优惠明细 2', ((None, 'AY', 'gas_quantity'), (None, 'AZ', 'total_discount'))),
+)
+
+# Smallest size a JPEG invoice is decoded at when libjpeg can scale it down
+_JPEG_DRAFT_SIZE = (2048, 2048)
+
+# Retry policy for transient Gemini API errors
+_RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+_BACKOFF_BASE = 2  # seconds
+_BACKOFF_CAP = 60  # seconds
+
+# Request limits shared by every InvoiceProcessor. The GUI creates a processor
+# per image and runs each on its own thread and event loop, so the limits are
+# kept at module level with thread-safe primitives instead of asyncio ones
+_RATE_WINDOW = 60  # Rolling window size in seconds
+_SLOT_POLL_INTERVAL = 0.05  # seconds between attempts to take a request slot
+_request_slots = threading.BoundedSemaphore(settings.GEMINI_MAX_CONCURRENCY)
+_request_times: deque = deque()  # Timestamps of requests in the rolling window
+_request_times_lock = threading.Lock()
+
+# Shared decoder for extracting a JSON object embedded in surrounding text
+_JSON_DECODER = json.JSONDecoder()
+
+# Raw model responses of recent requests, so retrying an invoice costs no API
+# call; module level because the GUI creates a processor per invoice
+_RESPONSE_CACHE_SIZE = 256
+_response_cache: "OrderedDict[bytes, str]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# Batch job states after which the job no longer changes
+_BATCH_FINAL_STATES = frozenset({
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+    types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+})
+
+
+def _parse_fields(data: Dict[str, Any], fields: Tuple[Tuple[str, Callable[[Any], float]], ...]) -> Dict[str, float]:
+    """
+    Parse the numeric fields of a recognition result in one pass.
+
+    Args:
+        data: Recognition result
+        fields: (field, parser) pairs to parse
+
+    Returns:
+        Mapping of field name to parsed value
+    """
+    return {field: parse(data[field]) for field, parse in fields}
+
+
+def _build_updates(template: Tuple[Tuple[str, Tuple[Tuple[Optional[int], str, str], ...]], ...],
+                   values: Dict[str, float], day: int) -> List[Dict[str, Any]]:
+    """
+    Fill an update template with the computed values.
+
+    Args:
+        template: (sheet, ((row, column, value key), ...)) entries
+        values: Computed values keyed by value key
+        day: Shift day used for date-located cells
+
+    Returns:
+        Update instructions for the Excel updater
+    """
+    updates = []
+    for sheet, cells in template:
+        if cells[0][0] is None:
+            updates.append({
+                'sheet': sheet,
+                'date': day,
+                'updates': [{'column': column, 'value': values[key]} for _, column, key in cells]
+            })
+        else:
+            updates.append({
+                'sheet': sheet,
+                'updates': [{'row': row, 'column': column, 'value': values[key]} for row, column, key in cells]
+            })
+    return updates
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Get how long to wait before retrying a failed API call.
+
+    Rate limits (429), server errors (5xx) and transport failures are
+    transient; a Retry-After header is honoured, otherwise the delay is
+    min(cap, base * 2**attempt) plus up to a second of jitter so concurrent
+    invoices do not retry in lockstep.
+
+    Args:
+        error: Exception raised by the API call
+        attempt: Zero-based number of the failed attempt
+
+    Returns:
+        Seconds to wait, or None if the error is not worth retrying
+    """
+    if isinstance(error, genai_errors.APIError):
+        if error.code not in _RETRYABLE_STATUS:
+            return None
+        headers = getattr(error.response, 'headers', None) or {}
+        try:
+            return float(headers.get('retry-after'))
+        except (TypeError, ValueError):
+            pass
+    elif not isinstance(error, httpx.TransportError):
+        # Older SDKs only surfaced quota errors through the message
+        message = str(error).lower()
+        if "rate limit exceeded" not in message and "quota exceeded" not in message:
+            return None
+    return min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt) + random.random()
+
+
+@lru_cache(maxsize=1)
+def _get_client() -> genai.Client:
+    """
+    Get the Gemini client shared by all processors.
+
+    A processor is created per invoice, so sharing the client reuses its
+    HTTP connection pool instead of paying a new TLS handshake every time.
+
+    Returns:
+        Configured Gemini client
+    """
+    return genai.Client(api_key=settings.GEMINI_API_KEY, http_options={'base_url': settings.GEMINI_BASE_URL})
+
+
+def _open_image(path: Path) -> Tuple[Image.Image, bytes]:
+    """
+    Read an image file in one go and decode it from memory.
+
+    Args:
+        path: Path to the image file
+
+    Returns:
+        Tuple of the fully loaded image and the file's bytes
+    """
+    # The file is closed as soon as it is read; the bytes also key the
+    # response cache
+    data = path.read_bytes()
+    with Image.open(BytesIO(data)) as image:
+        if image.format == 'JPEG':
+            # Let libjpeg decode large scans at a reduced scale directly
+            # (never below _JPEG_DRAFT_SIZE) and in RGB mode
+            image.draft('RGB', _JPEG_DRAFT_SIZE)
+        image.load()
+    return image, data
+
+
+def _response_cache_key(category: str, image_name: str, image_bytes: bytes) -> bytes:
+    """
+    Hash everything the model sees for an invoice into a cache key.
+
+    Args:
+        category: Image category, which selects the prompt and schema
+        image_name: Image name embedded in the prompt
+        image_bytes: Encoded image that determines what is sent
+
+    Returns:
+        BLAKE2b digest of the request content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{category}\0{image_name}\0".encode())
+    digest.update(image_bytes)
+    return digest.digest()
+
+
+def _get_cached_response(key: bytes) -> Optional[str]:
+    """
+    Look up a cached response text and mark it as recently used.
+
+    Args:
+        key: Key from _response_cache_key
+
+    Returns:
+        Cached response text, or None if absent
+    """
+    with _response_cache_lock:
+        text = _response_cache.get(key)
+        if text is not None:
+            _response_cache.move_to_end(key)
+        return text
+
+
+def _cache_response(key: bytes, text: str) -> None:
+    """
+    Store a response text, evicting the least recently used one when full.
+
+    Args:
+        key: Key from _response_cache_key
+        text: Response text that parsed and validated successfully
+    """
+    with _response_cache_lock:
+        _response_cache[key] = text
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > _RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
 
 class InvoiceProcessor:
     """Utility class for processing invoices using Gemini API"""
@@ -25,49 +291,107 @@ class InvoiceProcessor:
             shift_config: Configuration for shift-related parameters
         """
         # Configure Gemini
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY, http_options={'base_url': settings.GEMINI_BASE_URL})
+        self.client = _get_client()
         self.model = settings.GEMINI_MODEL
-        self._last_request_time = 0
-        # 6 seconds between requests (10 RPM = 1 request per 6 seconds)
-        self.min_request_interval = 6
-        self._request_times = []  # Track request timestamps for rolling window
-        self.rpm_limit = 10  # Gemini API limit of 10 requests per minute
-        self.window_size = 60  # Rolling window size in seconds
         self.shift_config = shift_config
+        # Category -> post-processing handler
+        self._category_handlers = {
+            "货车帮": self._process_huochebang,
+            "滴滴加油": self._process_didijia,
+            "国通1": partial(self._process_guotong, category="国通1"),
+            "国通2": partial(self._process_guotong, category="国通2"),
+            "团油": self._process_tuanyou,
+            "POS": self._process_pos,
+            "超市销售收入": self._process_supermarket,
+            "抖音": self._process_douyin,
+        }
 
-    async def _wait_for_rate_limit(self):
-        """Wait if needed to respect rate limits"""
-        current_time = asyncio.get_event_loop().time()
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_config_template(category: str) -> types.GenerateContentConfig:
+        """
+        Build the generation config for a category once and cache it.
 
-        # Clean up old request times
-        self._request_times = [
-            t for t in self._request_times if current_time - t < self.window_size]
+        Args:
+            category: Image category
 
-        # Check if we've hit the RPM limit
-        if len(self._request_times) >= self.rpm_limit:
-            # Calculate wait time until oldest request expires from window
-            wait_time = self.window_size - \
-                (current_time - self._request_times[0])
-            if wait_time > 0:
-                logger.info(
-                    f"Rate limiting: waiting {wait_time:.2f} seconds to respect RPM limit")
-                await asyncio.sleep(wait_time)
-                # Clean up again after waiting
-                current_time = asyncio.get_event_loop().time()
-                self._request_times = [
-                    t for t in self._request_times if current_time - t < self.window_size]
-
-        # Ensure minimum interval between requests
-        time_since_last_request = current_time - self._last_request_time
-        if time_since_last_request < self.min_request_interval:
-            wait_time = self.min_request_interval - time_since_last_request
+        Returns:
+            Config template; callers must copy it before making per-call changes
+        """
+        config = types.GenerateContentConfig(
+            system_instruction=INVOICE_SYSTEM_PROMPT,
+            max_output_tokens=settings.GEMINI_MAX_TOKENS,
+            temperature=settings.GEMINI_TEMPERATURE,
+            thinking_config=types.ThinkingConfig(thinking_level=types.ThinkingLevel.LOW),
+            media_resolution=types.MediaResolution.MEDIA_RESOLUTION_HIGH,
+            response_mime_type="application/json",
+        )
+        category_schema = get_category_schema(category)
+        if category_schema:
+            config.response_schema = category_schema
+        return config
+
+    @staticmethod
+    @asynccontextmanager
+    async def _request_slot():
+        """
+        Hold one of the GEMINI_MAX_CONCURRENCY request slots of the process.
+
+        The slot is polled instead of awaited in a worker thread: blocked
+        threads would fill the default executor that the API calls themselves
+        run on.
+        """
+        while not _request_slots.acquire(blocking=False):
+            await asyncio.sleep(_SLOT_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            _request_slots.release()
+
+    @staticmethod
+    async def _wait_for_rate_limit():
+        """
+        Wait if needed to respect the GEMINI_RPM limit of the process.
+
+        Requests are only limited by the rolling RPM window, so concurrent
+        invoices can use the whole per-minute budget instead of being spaced
+        out one by one.
+        """
+        while True:
+            with _request_times_lock:
+                current_time = time.monotonic()
+
+                # Clean up old request times
+                while _request_times and current_time - _request_times[0] >= _RATE_WINDOW:
+                    _request_times.popleft()
+
+                # Record the request if it fits the RPM limit
+                if len(_request_times) < settings.GEMINI_RPM:
+                    _request_times.append(current_time)
+                    return
+
+                # Wait until oldest request expires from window
+                wait_time = _RATE_WINDOW - (current_time - _request_times[0])
             logger.info(
-                f"Rate limiting: waiting {wait_time:.2f} seconds between requests")
+                f"Rate limiting: waiting {wait_time:.2f} seconds to respect RPM limit")
             await asyncio.sleep(wait_time)
 
-        # Update tracking
-        self._last_request_time = current_time
-        self._request_times.append(current_time)
+    async def process_invoice_batch(
+        self,
+        jobs: List[Tuple[Union[str, Path, Image.Image], str]],
+        max_concurrency: int = 10,
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Process several invoices concurrently within the RPM budget.
+
+        Args:
+            jobs: List of (invoice image, category) pairs
+            max_concurrency: Maximum number of invoices in flight at once
+
+        Returns:
+            Results in job order; a failed job yields its exception instead
+        """
+        return await BatchingInvoiceQueue(self, max_concurrency).run(jobs)
 
     async def _post_process_json(self, data: Dict[str, Any], category: str) -> Dict[str, Any]:
         """
@@ -81,30 +405,10 @@ class InvoiceProcessor:
             Processed JSON data
         """
         try:
-            # Common post-processing for all categories
-            processed_data = data.copy()
-
-            # Category-specific post-processing
-            if category == "货车帮":
-                # Add any 货车帮-specific processing here
-                result = await self._process_huochebang(processed_data)
-            elif category == "滴滴加油":
-                # Add any 滴滴加油-specific processing here
-                result = await self._process_didijia(processed_data)
-            elif category in ["国通1", "国通2"]:
-                # Add any 国通-specific processing here
-                result = await self._process_guotong(processed_data, category)
-            elif category == "团油":
-                result = await self._process_tuanyou(processed_data)
-            elif category == "POS":
-                result = await self._process_pos(processed_data)
-            elif category == "超市销售收入":
-                result = await self._process_supermarket(processed_data)
-            elif category == "抖音":
-                result = await self._process_douyin(processed_data)
-                
-
-            return result
+            # Category-specific post-processing; handlers only read the data,
+            # so it is passed through without copying
+            handler = self._category_handlers.get(category)
+            return await handler(data) if handler else data
 
         except Exception as e:
             logger.error(f"Error in post-processing JSON data: {str(e)}")
@@ -113,31 +417,14 @@ class InvoiceProcessor:
     async def _process_huochebang(self, processed_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process 货车帮 invoice data"""
         # Parse values using the utility function with appropriate units and scaling
-        diesel_stats = parse_numeric_value(
-            processed_data["柴油统计"],
-            unit="升"
-        )
+        v = _parse_fields(processed_data, _HUOCHEBANG_FIELDS)
+        diesel_stats = v["柴油统计"]
 
-        # Parse direct discount and station discount separately then sum
-        direct_discount = parse_numeric_value(
-            processed_data["油站直降"],
-            unit="元"
-        )
-        station_discount = parse_numeric_value(
-            processed_data["油站折扣"],
-            unit="元"
-        )
-        diesel_discount = round(direct_discount + station_discount, 2)
+        # Sum direct discount and station discount
+        diesel_discount = round(v["油站直降"] + v["油站折扣"], 2)
 
-        # Parse handling fee and settlement amount
-        handling_fee = parse_numeric_value(
-            processed_data["服务费"],
-            unit="元"
-        )
-        settlement_amount = parse_numeric_value(
-            processed_data["结算金额"],
-            unit="元"
-        )
+        handling_fee = v["服务费"]
+        settlement_amount = v["结算金额"]
 
         p = {
             'diesel_stats': round(diesel_stats / 3, 2),
@@ -146,21 +433,7 @@ class InvoiceProcessor:
             'settlement_amount': round(settlement_amount / 3, 2)
         }
 
-        updates = [{
-            'sheet': '调价前',
-            'updates': [
-                {'row': 81, 'column': 'E', 'value': p['handling_fee']},
-                {'row': 90, 'column': 'C', 'value': p['settlement_amount']}
-            ]
-        },
-            {
-            'sheet': '油品优惠明细 2',
-            'date': self.shift_config.date.day,
-            'updates': [
-                {'column': 'AA', 'value': p['diesel_stats']},
-                {'column': 'AB', 'value': p['diesel_discount']}
-            ]
-        }]
+        updates = _build_updates(_HUOCHEBANG_UPDATES, p, self.shift_config.date.day)
 
         return {
             'updates': updates,
@@ -170,36 +443,19 @@ class InvoiceProcessor:
     async def _process_didijia(self, processed_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process 滴滴加油 invoice"""
         # 实现具体的处理逻辑
-        gas_stats = parse_numeric_value(processed_data["油品数量"])
-        gas_discount = parse_numeric_value(processed_data["油品优惠合计"])
-        handling_fee = parse_numeric_value(processed_data["油品预收金额"]) - \
-            parse_numeric_value(processed_data["油品应收金额"])
-        settlement_amount = parse_numeric_value(
-            processed_data["油品应收金额"])
+        v = _parse_fields(processed_data, _DIDIJIA_FIELDS)
+        gas_stats = v["油品数量"]
+        gas_discount = v["油品优惠合计"]
+        handling_fee = v["油品预收金额"] - v["油品应收金额"]
+        settlement_amount = v["油品应收金额"]
         p = {
             'gas_stats': round(gas_stats / 3, 2),
             'gas_discount': round(gas_discount / 3, 2),
             'handling_fee': round(handling_fee / 3, 2),
             'settlement_amount': round(settlement_amount / 3, 2)
         }
-        updates = [{
-            'sheet': '调价前',
-            'updates': [
-                {'row': 81, 'column': 'E',
-                    'value': p['handling_fee']},
-                {'row': 88, 'column': 'C',
-                    'value': p['settlement_amount']}
-            ]
-        },
-            {
-            'sheet': '油品优惠明细 2',
-            'date': self.shift_config.date.day,
-            'updates': [
-                {'column': 'P', 'value': p['gas_stats']},
-                {'column': 'Q', 'value': p['gas_discount']}
-            ]
-        }
-        ]
+        updates = _build_updates(_DIDIJIA_UPDATES, p, self.shift_config.date.day)
+
         return {
             'updates': updates,
             'processed_data': p
@@ -208,29 +464,15 @@ class InvoiceProcessor:
     async def _process_guotong(self, processed_data: Dict[str, Any], category: str) -> Dict[str, Any]:
         """Process 国通 invoice"""
         # 实现具体的处理逻辑
-        settlement_amount = parse_numeric_value(processed_data["订单金额"]) - \
-            parse_numeric_value(processed_data["退款订单金额"])
+        v = _parse_fields(processed_data, _GUOTONG_FIELDS)
+        settlement_amount = v["订单金额"] - v["退款订单金额"]
         p = {
             'settlement_amount': round(settlement_amount / 3, 2)
         }
-        if category == "国通1":
-            updates = [{
-                'sheet': '调价前',
-                'updates': [
-                    {'row': 92, 'column': 'H',
-                        'value': p['settlement_amount']}
-                ]
-            }]
-        elif category == "国通2":
-            updates = [{
-                'sheet': '调价前',
-                'updates': [
-                    {'row': 93, 'column': 'H',
-                        'value': p['settlement_amount']}
-                ]
-            }]
-        else:
+        template = _GUOTONG_UPDATES.get(category)
+        if template is None:
             raise ValueError(f"Invalid category: {category}")
+        updates = _build_updates(template, p, self.shift_config.date.day)
 
         return {
             'updates': updates,
@@ -240,44 +482,19 @@ class InvoiceProcessor:
     async def _process_tuanyou(self, processed_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process 团油 invoice"""
         # 实现具体的处理逻辑
-        gas_stats = parse_numeric_value(
-            processed_data["加油升数汇总"],
-            unit="升"
-        )
-        handling_fee = parse_numeric_value(
-            processed_data["通道费汇总"],
-            unit="元"
-        )
-        settlement_amount = parse_numeric_value(
-            processed_data["实际结算金额汇总"],
-            unit="元"
-        )
-        gas_discount = parse_numeric_value(
-            processed_data["加油金额汇总"],
-            unit="元"
-        ) - settlement_amount - handling_fee
+        v = _parse_fields(processed_data, _TUANYOU_FIELDS)
+        gas_stats = v["加油升数汇总"]
+        handling_fee = v["通道费汇总"]
+        settlement_amount = v["实际结算金额汇总"]
+        gas_discount = v["加油金额汇总"] - settlement_amount - handling_fee
         p = {
             'gas_stats': round(gas_stats / 3, 2),
             'gas_discount': round(gas_discount / 3, 2),
             'handling_fee': round(handling_fee / 3, 2),
             'settlement_amount': round(settlement_amount / 3, 2)
         }
-        updates = [{
-            'sheet': '调价前',
-            'updates': [
-                {'row': 81, 'column': 'E',
-                    'value': p['handling_fee']},
-                {'row': 89, 'column': 'C',
-                    'value': p['settlement_amount']}
-            ]},
-            {
-            'sheet': '油品优惠明细 2',
-            'date': self.shift_config.date.day,
-            'updates': [
-                {'column': 'W', 'value': p['gas_stats']},
-                {'column': 'X', 'value': p['gas_discount']}
-            ]
-        }]
+        updates = _build_updates(_TUANYOU_UPDATES, p, self.shift_config.date.day)
+
         return {
             'updates': updates,
             'processed_data': p
@@ -290,12 +507,8 @@ class InvoiceProcessor:
         p = {
             'settlement_amount': round(settlement_amount / 3, 2)
         }
-        updates = [{
-            'sheet': '调价前',
-            'updates': [
-                {'row': 80, 'column': 'E', 'value': p['settlement_amount']}
-            ]
-        }]
+        updates = _build_updates(_POS_UPDATES, p, self.shift_config.date.day)
+
         return {
             'updates': updates,
             'processed_data': p
@@ -308,24 +521,109 @@ class InvoiceProcessor:
         p = {
             'settlement_amount': round(settlement_amount / 3, 2)
         }
-        updates = [{
-            'sheet': '调价前',
-            'updates': [
-                {'row': 71, 'column': 'H', 'value': p['settlement_amount']}
-            ]
-        }]
+        updates = _build_updates(_SUPERMARKET_UPDATES, p, self.shift_config.date.day)
+
         return {
             'updates': updates,
             'processed_data': p
         }
 
-    async def process_invoice(self, invoice_image: Union[str, Path, Image.Image], category: str) -> Dict[str, Any]:
+    async def _load_invoice_image(
+            self, invoice_image: Union[str, Path, Image.Image]
+    ) -> Tuple[Union[Image.Image, types.Part], str, Optional[bytes]]:
+        """
+        Load, convert and preprocess an invoice image for the API.
+
+        Args:
+            invoice_image: Path to the invoice image file or PIL Image object
+
+        Returns:
+            Tuple of the image content to send, the image name and the encoded
+            bytes identifying the image (the JPEG sent, else the source file),
+            or None for an uncompressed in-memory image
+
+        Raises:
+            ValueError: If the image cannot be opened or fails preprocessing
+        """
+        # Load and prepare the image
+        if isinstance(invoice_image, Image.Image):
+            image = invoice_image
+            image_name = "uploaded_image"
+            source_bytes = None
+        else:
+            path = Path(invoice_image)
+            try:
+                image, source_bytes = await asyncio.to_thread(_open_image, path)
+                # Get filename
+                image_name = path.name.strip()
+            except Exception as e:
+                logger.error(
+                    f"Failed to open image file {invoice_image}: {str(e)}")
+                raise ValueError(f"Failed to open image file: {str(e)}")
+
+        # Convert to RGB if needed
+        if image.mode != 'RGB':
+            image = await asyncio.to_thread(image.convert, 'RGB')
+
+        # Validate and resize; an image compressed to fit the size limit is
+        # sent as its JPEG bytes so the SDK does not encode it again
+        image, encoded = await asyncio.to_thread(self._prepare_image, image)
+        if encoded is not None:
+            return types.Part.from_bytes(data=encoded, mime_type='image/jpeg'), image_name, encoded
+        return image, image_name, source_bytes
+
+    async def _parse_response_text(self, response_text: Optional[str], category: str) -> Dict[str, Any]:
+        """
+        Validate a raw model response and post-process it for its category.
+
+        Args:
+            response_text: JSON text returned by the model
+            category: Image category
+
+        Returns:
+            Processed JSON data
+
+        Raises:
+            ValueError: If the response is empty or fails validation
+        """
+        if not response_text:
+            raise ValueError("Empty response from API")
+
+        # Positional args are only formatted if a sink accepts the level
+        logger.info("Raw API response: {}", response_text)
+
+        try:
+            structured_data = json.loads(response_text)
+        except json.JSONDecodeError:
+            # The model sometimes wraps the object in prose or code fences; parse
+            # the first JSON object in place and ignore whatever trails it
+            start = response_text.find('{')
+            if start < 0:
+                raise ValueError("No JSON object found in API response")
+            structured_data, _ = _JSON_DECODER.raw_decode(response_text, start)
+
+        if not isinstance(structured_data, dict) or not structured_data:
+            raise ValueError(
+                "Response structure validation failed - expected non-empty dictionary")
+
+        missing_fields = get_missing_fields(category, structured_data)
+        if missing_fields:
+            raise ValueError(
+                f"Response is missing required fields: {', '.join(missing_fields)}")
+
+        # Post-process the JSON data based on category
+        return await self._post_process_json(structured_data, category)
+
+    async def process_invoice(self, invoice_image: Union[str, Path, Image.Image], category: str,
+                              use_cache: bool = True) -> Dict[str, Any]:
         """
         Process invoice image and extract structured information.
 
         Args:
             invoice_image: Path to the invoice image file or PIL Image object
             category: Category of the image (e.g., "货车帮", "滴滴加油", etc.)
+            use_cache: Reuse the response to an identical earlier request; pass
+                False to always ask the model again (e.g. when the user retries)
 
         Returns:
             Dictionary containing structured invoice information
@@ -334,101 +632,148 @@ class InvoiceProcessor:
             Exception: If there's an error in processing the invoice
         """
         try:
-            # Load and prepare the image
-            if isinstance(invoice_image, (str, Path)):
-                try:
-                    image = Image.open(invoice_image)
-                    # Get filename without extension
-                    image_name = str(invoice_image.name).strip()
-                except Exception as e:
-                    logger.error(
-                        f"Failed to open image file {invoice_image}: {str(e)}")
-                    raise ValueError(f"Failed to open image file: {str(e)}")
-            elif isinstance(invoice_image, Image.Image):
-                image = invoice_image
-                image_name = "uploaded_image"
-
-            # Convert to RGB if needed
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            # Wait for rate limit
-            await self._wait_for_rate_limit()
-
-            # Get category-specific prompts and schema
+            image_content, image_name, image_bytes = await self._load_invoice_image(invoice_image)
+
+            # An identical request was answered before; skip the API call.
+            # Uncompressed in-memory images have no encoded bytes to key on.
+            # A fresh response is still cached when the lookup is skipped
+            cache_key = None
+            if image_bytes is not None:
+                cache_key = await asyncio.to_thread(
+                    _response_cache_key, category, image_name, image_bytes)
+            cached_text = _get_cached_response(cache_key) \
+                if use_cache and cache_key is not None else None
+            if cached_text is not None:
+                logger.info("Reusing cached API response for {}", image_name)
+                return await self._parse_response_text(cached_text, category)
+
+            # Get category-specific prompts
             messages = get_invoice_recognition_messages(category, image_name)
-            category_schema = get_category_schema(category)
 
+            response = None
             try:
-                # Build config with structured output schema
-                config = types.GenerateContentConfig(
-                    system_instruction=INVOICE_SYSTEM_PROMPT,
-                    max_output_tokens=settings.GEMINI_MAX_TOKENS,
-                    temperature=settings.GEMINI_TEMPERATURE,
-                    thinking_config=types.ThinkingConfig(thinking_level=types.ThinkingLevel.LOW),
-                    media_resolution=types.MediaResolution.MEDIA_RESOLUTION_HIGH,
-                    response_mime_type="application/json",
-                )
-                if category_schema:
-                    config.response_schema = category_schema
-
-                # Call Gemini API with image and handle rate limits
+                # Copy the cached per-category config with structured output schema
+                config = self._get_config_template(category).model_copy()
+
+                # Call Gemini API with image; transient errors are retried with
+                # exponential backoff and jitter
                 max_retries = 3
-                retry_count = 0
-                response = None
 
-                while retry_count < max_retries:
+                for attempt in range(max_retries):
                     try:
-                        response = self.client.models.generate_content(
-                            model=self.model,
-                            config=config,
-                            contents=[messages[1]["content"], image]
-                        )
+                        # Every attempt is a request: take a concurrency slot, then
+                        # a slot in the per-minute window right before sending
+                        async with self._request_slot():
+                            await self._wait_for_rate_limit()
+                            # Run the blocking SDK call in a worker thread so other
+                            # invoices keep progressing on the event loop
+                            response = await asyncio.to_thread(
+                                self.client.models.generate_content,
+                                model=self.model,
+                                config=config,
+                                contents=[messages[1]["content"], image_content]
+                            )
                         break
                     except Exception as api_error:
-                        retry_count += 1
-                        if "Rate limit exceeded" in str(api_error) or "quota exceeded" in str(api_error).lower():
-                            if retry_count < max_retries:
-                                wait_time = (2 ** retry_count) * 5
-                                logger.warning(
-                                    f"Rate limit hit, waiting {wait_time} seconds before retry {retry_count}/{max_retries}")
-                                await asyncio.sleep(wait_time)
-                                continue
-                        logger.error(
-                            f"API call failed on attempt {retry_count}: {str(api_error)}")
-                        if retry_count == max_retries:
+                        wait_time = _retry_delay(api_error, attempt)
+                        if wait_time is None or attempt + 1 == max_retries:
+                            logger.error(
+                                f"API call failed on attempt {attempt + 1}: {str(api_error)}")
                             raise ValueError(
-                                f"Failed after {max_retries} attempts: {str(api_error)}")
-                        continue
-
-                if not response or not response.text:
-                    raise ValueError("Empty response from API")
-
-                logger.info(f"Raw API response: {response.text}")
-
-                structured_data = json.loads(response.text)
-
-                if not isinstance(structured_data, dict) or not structured_data:
-                    raise ValueError(
-                        "Response structure validation failed - expected non-empty dictionary")
-
-                # Post-process the JSON data based on category
-                processed_data = await self._post_process_json(
-                    structured_data, category)
-
-                return processed_data
+                                f"Failed after {attempt + 1} attempts: {str(api_error)}")
+                        logger.warning(
+                            f"Transient API error, waiting {wait_time:.1f} seconds before retry "
+                            f"{attempt + 1}/{max_retries}: {str(api_error)}")
+                        await asyncio.sleep(wait_time)
+
+                # response.text joins the response parts on every access
+                response_text = response.text if response else None
+                result = await self._parse_response_text(response_text, category)
+                # Only responses that passed validation (valid JSON with every
+                # required field) are reused; incomplete ones raised above
+                if cache_key is not None:
+                    _cache_response(cache_key, response_text)
+                return result
 
             except Exception as api_error:
                 logger.error(f"API Error: {str(api_error)}")
                 if response:
-                    logger.debug(
-                        f"API Response: {response.text if hasattr(response, 'text') else 'No response text'}")
+                    logger.opt(lazy=True).debug(
+                        "API Response: {}",
+                        lambda: response.text if hasattr(response, 'text') else 'No response text')
                 raise ValueError(f"API Error: {str(api_error)}")
 
         except Exception as e:
             logger.error(f"Error processing invoice image: {str(e)}")
             raise
-    
+
+    async def process_invoice_batch_job(
+        self,
+        jobs: List[Tuple[Union[str, Path, Image.Image], str]],
+        poll_interval: float = 10.0,
+        max_poll_interval: float = 60.0,
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Process invoices through a single Gemini batch job.
+
+        The whole batch is one API request, so it costs a single slot of the
+        RPM budget, but the job may take minutes to finish; interactive callers
+        should keep using process_invoice or process_invoice_batch.
+
+        Args:
+            jobs: List of (invoice image, category) pairs
+            poll_interval: Seconds before the first status poll
+            max_poll_interval: Upper bound of the doubling poll interval
+
+        Returns:
+            Results in job order; a failed job yields its exception instead
+
+        Raises:
+            ValueError: If an image cannot be loaded or the batch job fails
+        """
+        requests = []
+        for invoice_image, category in jobs:
+            image_content, image_name, _ = await self._load_invoice_image(invoice_image)
+            messages = get_invoice_recognition_messages(category, image_name)
+            requests.append(types.InlinedRequest(
+                contents=[messages[1]["content"], image_content],
+                config=self._get_config_template(category).model_copy(),
+            ))
+
+        async with self._request_slot():
+            await self._wait_for_rate_limit()
+            job = await asyncio.to_thread(
+                self.client.batches.create, model=self.model, src=requests)
+        logger.info(f"Submitted batch job {job.name} with {len(requests)} invoices")
+
+        # Poll with a doubling interval until the job reaches a final state
+        while job.state not in _BATCH_FINAL_STATES:
+            await asyncio.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+            job = await asyncio.to_thread(self.client.batches.get, name=job.name)
+
+        if job.state not in (types.JobState.JOB_STATE_SUCCEEDED,
+                             types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED):
+            raise ValueError(f"Batch job {job.name} ended in state {job.state}: {job.error}")
+
+        # Inline responses come back in request order
+        responses = job.dest.inlined_responses if job.dest else None
+        if not responses or len(responses) != len(jobs):
+            raise ValueError(f"Batch job {job.name} returned {len(responses or ())} responses "
+                             f"for {len(jobs)} invoices")
+
+        results: List[Union[Dict[str, Any], Exception]] = []
+        for (_, category), inlined in zip(jobs, responses):
+            try:
+                if inlined.error:
+                    raise ValueError(f"API Error: {inlined.error}")
+                results.append(await self._parse_response_text(
+                    inlined.response.text if inlined.response else None, category))
+            except Exception as e:
+                logger.error(f"Error processing batch invoice ({category}): {str(e)}")
+                results.append(e)
+        return results
+
     async def _process_douyin(self, processed_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process 抖音 invoice data from Gemini recognition result.
 
@@ -438,14 +783,15 @@ class InvoiceProcessor:
         Returns:
             Dictionary containing processed data and update instructions
         """
-        total_voucher_value = parse_numeric_value(processed_data["用户侧划线价合计"])
-        total_received = parse_numeric_value(processed_data["订单实收合计"])
-        total_merchant_revenue = parse_numeric_value(processed_data["预计收入合计"])
+        v = _parse_fields(processed_data, _DOUYIN_FIELDS)
+        total_voucher_value = v["用户侧划线价合计"]
+        total_received = v["订单实收合计"]
+        total_merchant_revenue = v["预计收入合计"]
 
         total_discount = total_voucher_value - total_received
         handling_fee = total_received - total_merchant_revenue
-        gas_quantity = total_voucher_value / \
-            self.shift_config.gas_price if self.shift_config.gas_price > 0 else 0
+        gas_price = self.shift_config.gas_price
+        gas_quantity = total_voucher_value / gas_price if gas_price > 0 else 0
 
         p = {
             'gas_quantity': round(gas_quantity / 3, 2),
@@ -454,25 +800,7 @@ class InvoiceProcessor:
             'merchant_revenue': round(total_merchant_revenue / 3, 2)
         }
 
-        updates = [{
-            'sheet': '调价前',
-            'updates': [
-                {'row': 81, 'column': 'E',
-                    'value': p['handling_fee']},
-                {'row': 93, 'column': 'C',
-                    'value': p['merchant_revenue']}
-            ]
-        },
-            {
-            'sheet': '油品优惠明细 2',
-            'date': self.shift_config.date.day,
-            'updates': [
-                {'column': 'AY', 'value': p['gas_quantity']},
-                {'column': 'AZ',
-                    'value': p['total_discount']},
-            ]
-        }
-        ]
+        updates = _build_updates(_DOUYIN_UPDATES, p, self.shift_config.date.day)
 
         return {
             'updates': updates,
@@ -480,6 +808,73 @@ class InvoiceProcessor:
         }
 
 
+    @staticmethod
+    def _compress_to_limit(image: Image.Image, max_size_mb: float,
+                           min_quality: int = 50, max_quality: int = 85) -> bytes:
+        """
+        Encode the image as JPEG at the highest quality that fits the size limit.
+
+        The image is encoded once at max_quality, which is enough in the common
+        case. Otherwise the quality is scaled by sqrt(limit / size) for one
+        more encode, which usually fits; only if it still does not is the
+        quality binary searched below it. A single buffer is reused for every
+        probe. Optimized Huffman tables and progressive scans keep each encode
+        smaller, so a higher quality fits the limit.
+
+        Args:
+            image: PIL Image object
+            max_size_mb: Maximum encoded size in MB
+            min_quality: Lowest acceptable JPEG quality
+            max_quality: JPEG quality tried first
+
+        Returns:
+            JPEG bytes of the best fitting encode
+
+        Raises:
+            ValueError: If encoding fails or even min_quality exceeds the limit
+        """
+        max_bytes = max_size_mb * 1024 * 1024
+        buffer = BytesIO()
+
+        def encode(quality: int) -> int:
+            buffer.seek(0)
+            buffer.truncate()
+            try:
+                image.save(buffer, format='JPEG', quality=quality,
+                           optimize=True, progressive=True)
+            except Exception as e:
+                raise ValueError(f"Failed to compress image: {str(e)}")
+            return buffer.tell()
+
+        size = encode(max_quality)
+        if size <= max_bytes:
+            return buffer.getvalue()
+
+        # JPEG size falls roughly with the square of the quality reduction
+        estimate = int(max_quality * math.sqrt(max_bytes / size))
+        quality = max(min_quality, min(max_quality - 1, estimate))
+        size = encode(quality)
+        if size <= max_bytes:
+            return buffer.getvalue()
+
+        best = None
+        smallest_size = size
+        low, high = min_quality, quality - 1
+        while low <= high:
+            quality = (low + high) // 2
+            size = encode(quality)
+            if size <= max_bytes:
+                best = buffer.getvalue()
+                low = quality + 1
+            else:
+                smallest_size = min(smallest_size, size)
+                high = quality - 1
+
+        if best is None:
+            raise ValueError(
+                f"Image size ({smallest_size / (1024 * 1024):.2f}MB) exceeds maximum size even after compression")
+        return best
+
     def preprocess_image(self, image: Image.Image) -> Image.Image:
         """
         Preprocess and validate the image.
@@ -490,6 +885,22 @@ class InvoiceProcessor:
         Returns:
             Preprocessed PIL Image object
 
+        Raises:
+            ValueError: If image validation fails
+        """
+        return self._prepare_image(image)[0]
+
+    def _prepare_image(self, image: Image.Image) -> Tuple[Image.Image, Optional[bytes]]:
+        """
+        Preprocess and validate the image, keeping the JPEG encode if one was needed.
+
+        Args:
+            image: PIL Image object
+
+        Returns:
+            Tuple of the preprocessed image and its JPEG bytes, or None when the
+            image did not need compressing
+
         Raises:
             ValueError: If image validation fails
         """
@@ -498,6 +909,11 @@ class InvoiceProcessor:
             if not isinstance(image, Image.Image):
                 raise ValueError("Input must be a PIL Image object")
 
+            # Phone photos keep their rotation in EXIF, which neither upload
+            # format carries over, so apply it to the pixels once
+            if image.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+                image = ImageOps.exif_transpose(image)
+
             # Get image dimensions
             try:
                 width, height = image.size
@@ -517,14 +933,15 @@ class InvoiceProcessor:
                 logger.info(
                     f"Resizing image from {width}x{height} to {new_size[0]}x{new_size[1]}")
                 try:
-                    image = image.resize(new_size, Image.Resampling.LANCZOS)
+                    image = image.resize(new_size, Image.Resampling.BILINEAR)
                 except Exception as e:
                     raise ValueError(f"Failed to resize image: {str(e)}")
 
-            # Check file size
+            # Check file size; the raw pixel size of the (possibly resized) image
+            # bounds the encoded upload, so smaller images never need compressing
             max_size_mb = 20
             try:
-                image_size_mb = (width * height *
+                image_size_mb = (image.width * image.height *
                                  len(image.getbands())) / (1024 * 1024)
             except Exception as e:
                 raise ValueError(f"Failed to calculate image size: {str(e)}")
@@ -532,33 +949,57 @@ class InvoiceProcessor:
             if image_size_mb > max_size_mb:
                 logger.info(
                     f"Image size ({image_size_mb:.2f}MB) exceeds limit, attempting compression")
-                # Compress image
-                quality = 85
-                while image_size_mb > max_size_mb and quality > 50:
-                    try:
-                        # Save to bytes to check size
-                        from io import BytesIO
-                        buffer = BytesIO()
-                        image.save(buffer, format='JPEG', quality=quality)
-                        image_size_mb = len(buffer.getvalue()) / (1024 * 1024)
-                        quality -= 5
-                    except Exception as e:
-                        raise ValueError(f"Failed to compress image: {str(e)}")
-
-                if image_size_mb > max_size_mb:
-                    raise ValueError(
-                        f"Image size ({image_size_mb:.2f}MB) exceeds maximum size even after compression")
-
-                try:
-                    # Load the compressed image
-                    buffer.seek(0)
-                    image = Image.open(buffer)
-                except Exception as e:
-                    raise ValueError(
-                        f"Failed to load compressed image: {str(e)}")
+                # Compress image; the encoded bytes are sent as-is, so the
+                # decoded image is kept instead of decoding the JPEG again
+                return image, self._compress_to_limit(image, max_size_mb)
 
-            return image
+            return image, None
 
         except Exception as e:
             logger.error(f"Error preprocessing image: {str(e)}")
             raise ValueError(f"Image preprocessing failed: {str(e)}")
+
+
+class BatchingInvoiceQueue:
+    """Queue feeding invoice jobs to a fixed set of workers sharing one InvoiceProcessor"""
+
+    def __init__(self, processor: InvoiceProcessor, num_workers: int = 10):
+        """
+        Initialize the batching queue.
+
+        Args:
+            processor: Processor whose rate limiter is shared by all workers
+            num_workers: Number of concurrent worker tasks
+        """
+        self.processor = processor
+        self.num_workers = num_workers
+
+    async def run(
+        self, jobs: List[Tuple[Union[str, Path, Image.Image], str]]
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Process all jobs and wait for them to finish.
+
+        Args:
+            jobs: List of (invoice image, category) pairs
+
+        Returns:
+            Results in job order; a failed job yields its exception instead
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for index, job in enumerate(jobs):
+            queue.put_nowait((index, job))
+        results: List[Union[Dict[str, Any], Exception]] = [None] * len(jobs)
+
+        async def worker() -> None:
+            while not queue.empty():
+                index, (invoice_image, category) = queue.get_nowait()
+                try:
+                    results[index] = await self.processor.process_invoice(
+                        invoice_image, category)
+                except Exception as e:
+                    results[index] = e
+
+        await asyncio.gather(
+            *(worker() for _ in range(min(self.num_workers, len(jobs)))))
+        return results
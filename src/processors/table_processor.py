@@ -1,9 +1,18 @@
 from typing import Dict, Any, Union
+import re
 from pathlib import Path
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 from src.utils.logger import logger
 from src.config.shift_config import ShiftConfig
 
+# Rust-backed calamine reader (python-calamine is a declared dependency)
+EXCEL_ENGINE = 'calamine'
+
+# 预编译的匹配模式
+_GAS_PRODUCT_RE = re.compile('92#|95#')
+_ONLINE_PAY_RE = re.compile('微信|支付宝')
+
 
 class TableProcessor:
     """Utility class for processing table files"""
@@ -65,13 +74,16 @@ class TableProcessor:
             # 按第三列（C列）分组并处理数据
             df = pd.read_excel(
                 path,
+                engine=EXCEL_ENGINE,
                 skiprows=2,  # 跳过前两行
                 usecols=[1, 2, 3],  # 只读取B、C、D列
                 names=['机号', '油品', '加油升']
             )
-            # 数据清洗和处理
-            df['加油升'] = pd.to_numeric(df['加油升'], errors='coerce') / 3  # 数值处理
-            df['加油升'] = df['加油升'].round(2)  # 保留两位小数
+            # 数据清洗和处理：引擎已解析为数值列时无需再做字符串转换
+            liters = df['加油升']
+            if not is_numeric_dtype(liters):
+                liters = pd.to_numeric(liters, errors='coerce')
+            df['加油升'] = (liters / 3).round(2)  # 保留两位小数
             # 清理油品列的空格
             df['油品'] = df['油品'].str.strip()
 
@@ -81,19 +93,13 @@ class TableProcessor:
                 '95#汽油': 'C'
             }
 
-            # 构建更新指令
-            updates = []
-            for _, row in df.iterrows():
-                if pd.notna(row['加油升']):  # 只处理非空值
-                    section = fuel_type_mapping.get(row['油品'])
-                    if section:
-                        updates.append({
-                            'sheet': sheet,
-                            'section': section,
-                            'product_name': row['机号'],
-                            'column': 'D',  # D列
-                            'value': row['加油升']
-                        })
+            # 构建更新指令：只处理非空值和已知油品
+            df['section'] = df['油品'].map(fuel_type_mapping)
+            df = df.dropna(subset=['加油升', 'section'])
+            records = df[['section', '机号', '加油升']].rename(
+                columns={'机号': 'product_name', '加油升': 'value'}).to_dict('records')
+            updates = [{'sheet': sheet, 'column': 'D', **record}  # D列
+                       for record in records]
 
             return {
                 'updates': updates,
@@ -109,23 +115,18 @@ class TableProcessor:
         try:
             df = pd.read_excel(
                 path,
+                engine=EXCEL_ENGINE,
                 usecols=['油品', '优惠'],  # Only read product and discount columns
             )
 
-            # Initialize discount sums
-            gasoline_discount = 0.0  # 汽油优惠总和 (92#和95#)
-            diesel_discount = 0.0    # 柴油优惠总和
-
-            # Process each row
-            for _, row in df.iterrows():
-                product = str(row['油品']).strip()
-                discount = float(row['优惠']) if pd.notna(row['优惠']) else 0.0
+            products = df['油品'].astype(str).str.strip()
+            discounts = pd.to_numeric(df['优惠'], errors='coerce').fillna(0.0)
 
-                # Sum up discounts based on product type
-                if '92#' in product or '95#' in product:
-                    gasoline_discount += discount
-                elif '0#' in product:
-                    diesel_discount += discount
+            # Sum up discounts based on product type
+            gas_mask = products.str.contains(_GAS_PRODUCT_RE, na=False)
+            diesel_mask = products.str.contains('0#', regex=False, na=False) & ~gas_mask
+            gasoline_discount = float(discounts[gas_mask].sum())  # 汽油优惠总和 (92#和95#)
+            diesel_discount = float(discounts[diesel_mask].sum())  # 柴油优惠总和
 
             processed_data = {
                 'gasoline_discount': round(gasoline_discount / 3, 2),
@@ -157,12 +158,15 @@ class TableProcessor:
         """Process 加油明细 table"""
         df = pd.read_excel(
             path,
+            engine=EXCEL_ENGINE,
             skiprows=2,  # 跳过前两行
             usecols=['结算金额', '收款方式']
         )
 
-        customer_discount = df[df['收款方式'] == '充值卡收款']['结算金额'].sum()
-        electric_discount = df[df['收款方式'] == '电子卡收款']['结算金额'].sum()
+        # 一次分组求和得到各收款方式的结算金额
+        sums = df.groupby('收款方式', sort=False)['结算金额'].sum()
+        customer_discount = sums.get('充值卡收款', 0.0)
+        electric_discount = sums.get('电子卡收款', 0.0)
 
         processed_data = {
             'customer_discount': round(customer_discount / 3, 2),
@@ -187,7 +191,8 @@ class TableProcessor:
     async def _process_tonglian(self, path: Path) -> Dict[str, Any]:
         """Process 通联 table"""
         # 实现具体的处理逻辑
-        df = pd.read_excel(path, skiprows=1, usecols=['原始金额', '收支方向'])
+        df = pd.read_excel(
+            path, engine=EXCEL_ENGINE, skiprows=1, usecols=['原始金额', '收支方向'])
         income = df[df['收支方向'] == '收入']['原始金额'].sum()
 
         p = {
@@ -209,18 +214,18 @@ class TableProcessor:
     async def _process_recharge_details(self, path: Path) -> Dict[str, Any]:
         """Process 充值明细表格"""
         try:
-            df = pd.read_excel(path, skiprows=2, usecols=['充值金额', '充值赠送', '付款方式'])
+            df = pd.read_excel(
+                path, engine=EXCEL_ENGINE, skiprows=2, usecols=['充值金额', '充值赠送', '付款方式'])
 
-            # 将充值金额和充值赠送的 NaN 值填充为 0
-            df['充值金额'] = df['充值金额'].fillna(0)
-            df['充值赠送'] = df['充值赠送'].fillna(0)
+            # 充值金额与充值赠送合并为每行总额，NaN 值按 0 计
+            totals = df['充值金额'].fillna(0) + df['充值赠送'].fillna(0)
 
             # 创建在线支付和现金支付的掩码
-            online_mask = (df['付款方式'].str.contains('微信|支付宝', na=False))
-            cash_mask = (df['付款方式'].str.contains('现金', na=False))
-            
-            online_recharge = df[online_mask]['充值金额'].sum() + df[online_mask]['充值赠送'].sum()
-            cash_recharge = df[cash_mask]['充值金额'].sum() + df[cash_mask]['充值赠送'].sum()
+            online_mask = (df['付款方式'].str.contains(_ONLINE_PAY_RE, na=False))
+            cash_mask = (df['付款方式'].str.contains('现金', regex=False, na=False))
+
+            online_recharge = totals[online_mask].sum()
+            cash_recharge = totals[cash_mask].sum()
 
             p = {
                 'online_recharge': round(online_recharge / 3, 2),
@@ -0,0 +1,148 @@
+import threading
+import time
+import zipfile
+
+import numpy as np
+import openpyxl
+import pytest
+from .excel_updater import ExcelUpdater
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    """Create a small workbook with the sheets the updater patches."""
+    path = tmp_path / "statement.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = '调价前'
+    sheet['E81'] = 0
+    sheet['E81'].number_format = '0.00'
+    sheet['F81'] = '=E81*2'
+    workbook.create_sheet('调价后')['C5'] = 1.5
+    workbook.save(path)
+    return path
+
+
+def test_apply_updates_fast_writes_numpy_values(workbook_path, monkeypatch):
+    """Test that numpy values are patched as plain numbers the workbook can reload."""
+    def fail(*args, **kwargs):
+        raise AssertionError("Expected the zip patch path, not the full update")
+    monkeypatch.setattr(ExcelUpdater, 'apply_updates', fail)
+
+    ExcelUpdater.apply_updates_fast(workbook_path, [
+        {'sheet': '调价前', 'updates': [
+            {'row': 81, 'column': 'E', 'value': np.float64(1.11)},
+            {'row': 81, 'column': 'E', 'value': np.float64(2.22)},
+        ]},
+        {'sheet': '调价后', 'updates': [
+            {'row': 5, 'column': 'C', 'value': np.float64(7.5)},
+        ]},
+    ])
+
+    with zipfile.ZipFile(workbook_path) as archive:
+        assert 'np.float64' not in archive.read('xl/worksheets/sheet1.xml').decode()
+        assert 'fullCalcOnLoad="1"' in archive.read('xl/workbook.xml').decode()
+
+    workbook = openpyxl.load_workbook(workbook_path)
+    assert workbook['调价前']['E81'].value == 3.33
+    assert workbook['调价前']['E81'].number_format == '0.00'
+    assert workbook['调价前']['F81'].value == '=E81*2'
+    assert workbook['调价后']['C5'].value == 7.5
+
+
+def test_apply_updates_fast_writes_whole_numbers_as_ints(workbook_path):
+    """Test that whole-number values are written without a trailing '.0'."""
+    ExcelUpdater.apply_updates_fast(workbook_path, [
+        {'sheet': '调价前', 'updates': [
+            {'row': 81, 'column': 'E', 'value': np.float64(1.5)},
+            {'row': 81, 'column': 'E', 'value': 0.5},
+        ]},
+    ])
+
+    with zipfile.ZipFile(workbook_path) as archive:
+        assert '<v>2</v>' in archive.read('xl/worksheets/sheet1.xml').decode()
+    assert openpyxl.load_workbook(workbook_path)['调价前']['E81'].value == 2
+
+
+def test_apply_updates_fast_rejects_non_finite_values(workbook_path):
+    """Test that NaN is refused and the workbook is left untouched."""
+    original = workbook_path.read_bytes()
+
+    with pytest.raises(ValueError):
+        ExcelUpdater.apply_updates_fast(workbook_path, [
+            {'sheet': '调价前', 'updates': [
+                {'row': 81, 'column': 'E', 'value': np.float64('nan')},
+            ]},
+        ])
+
+    assert workbook_path.read_bytes() == original
+
+
+@pytest.mark.parametrize("row,column", [
+    (81, 'F'),  # Formula cell
+    (90, 'E'),  # Cell missing from the sheet XML
+])
+def test_apply_updates_fast_falls_back_to_full_update(workbook_path, row, column):
+    """Test that cells the zip patch cannot handle go through openpyxl."""
+    ExcelUpdater.apply_updates_fast(workbook_path, [
+        {'sheet': '调价前', 'updates': [
+            {'row': row, 'column': column, 'value': np.float64(4.56)},
+        ]},
+    ])
+
+    workbook = openpyxl.load_workbook(workbook_path)
+    assert workbook['调价前'][f'{column}{row}'].value == 4.56
+    assert workbook['调价前']['E81'].value == 0
+
+
+def test_apply_updates_resolves_section_and_date_rows(tmp_path):
+    """Test that section and date updates find their rows in the loaded workbook."""
+    path = tmp_path / "sections.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = '调价前'
+    sheet['A3'], sheet['B3'] = 'A', '1号'
+    sheet['B4'] = '=B3'  # Formula cells keep their formula text
+    sheet['A5'], sheet['B5'] = 'B ', '1号'
+    dates = workbook.create_sheet('油品优惠明细 2')
+    dates['B2'], dates['B3'] = 4, 5
+    workbook.save(path)
+
+    updater = ExcelUpdater(path)
+    # Rows are resolved from the in-memory sheet, not from the file on disk
+    updater.workbook['调价前']['B6'] = '2号'
+    updater.apply_updates([
+        {'sheet': '调价前', 'section': 'B', 'product_name': '1号', 'column': 'D', 'value': 7},
+        {'sheet': '调价前', 'section': 'B', 'product_name': '2号', 'column': 'D', 'value': 8},
+        {'sheet': '调价前', 'section': 'A', 'product_name': '=B3', 'column': 'D', 'value': 9},
+        {'sheet': '油品优惠明细 2', 'date': 5, 'updates': [{'column': 'C', 'value': 3.3}]},
+    ])
+
+    sheet = updater.workbook['调价前']
+    assert [sheet[f'D{row}'].value for row in range(3, 7)] == [None, 9, 7, 8]
+    assert updater.workbook['油品优惠明细 2']['C3'].value == 3.3
+    updater.release()
+
+
+def test_release_waits_for_background_save(workbook_path, monkeypatch):
+    """Test that release() lets a pending background save finish first."""
+    started = threading.Event()
+    original_save = ExcelUpdater._save
+
+    def slow_save(self):
+        started.set()
+        time.sleep(0.2)
+        original_save(self)
+    monkeypatch.setattr(ExcelUpdater, '_save', slow_save)
+
+    updater = ExcelUpdater(workbook_path)
+    updater.apply_updates([
+        {'sheet': '调价前', 'updates': [{'row': 81, 'column': 'E', 'value': 5}]},
+    ])
+    future = updater.save_workbook(async_=True)
+    started.wait()
+    updater.release()
+
+    assert future.done()
+    future.result()
+    assert openpyxl.load_workbook(workbook_path)['调价前']['E81'].value == 5
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from .test_table import process_douyin
+
+
+@pytest.fixture
+def douyin_path(tmp_path):
+    """Create a Douyin export with blank cells inside the time window."""
+    path = tmp_path / "douyin.xlsx"
+    pd.DataFrame({
+        '核销时间': pd.to_datetime([
+            '2025-01-01 08:00:00', '2025-01-01 09:00:00',
+            '2025-01-01 10:00:00', '2025-01-02 09:00:00',
+        ]),
+        '商品名称': ['186代200元汽油代金券', '186代200元汽油代金券', '100元代金券', '100元代金券'],
+        '实际核销数量': [1, np.nan, 2, 5],
+        '订单实收': [186, 186, np.nan, 500],
+        '商家应得': [180, 180, np.nan, 480],
+    }).to_excel(path, index=False)
+    return path
+
+
+def test_process_douyin_skips_blank_cells(douyin_path):
+    """Test that blank quantities and amounts are skipped instead of turning totals into NaN."""
+    result = process_douyin(
+        douyin_path, datetime(2025, 1, 1, 0, 0), datetime(2025, 1, 1, 23, 59), gas_price=8)
+
+    # 代金券 200 * 1 + 100 * 2 = 400，实收 372，商家应得 360，均按三班平分
+    assert result['processed_data'] == {
+        'gas_quantity': 16.67,
+        'total_discount': 9.33,
+        'handling_fee': 4.0,
+        'merchant_revenue': 120.0,
+    }
@@ -1,7 +1,11 @@
 from datetime import date, datetime
+from functools import lru_cache
 import re
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
 import openpyxl
+from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
@@ -10,6 +14,17 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 代金券面额："【春节不打烊】186代200元汽油代金券" 中 "元" 前的数字
+_VOUCHER_RE = re.compile(r'(\d+)元')
+
+# 列字母到从0开始的列号：预先计算 A..ZZ
+_COL_INDEX = {get_column_letter(n): n - 1 for n in range(1, 703)}
+
+# 抖音核销统计的默认时间窗口和油价
+_DOUYIN_START = datetime(2025, 2, 5, 8, 0, 0)
+_DOUYIN_END = datetime(2025, 2, 6, 8, 0, 0)
+_DOUYIN_GAS_PRICE = 7.25
+
 
 def process_table_data() -> None:
     """处理Excel表格数据并保留原有格式
@@ -29,45 +44,11 @@ def process_table_data() -> None:
     output_dir.mkdir(parents=True, exist_ok=True)
 
     source_file = "tables/抖音_20250208_151906.xlsx"
-    target_file = "output/table/T-XW5-1.xlsx"
 
     try:
         result = process_douyin(source_file)
         updates = result['updates']
-        print(updates)
-        # workbook = openpyxl.load_workbook(target_file)
-
-        # for update in updates:
-        #     sheet_name = update['sheet']
-        #     sheet = workbook[sheet_name]
-
-        #     # 根据区域和机号更新数据
-        #     target_section = update['section']
-        #     if target_section in ['A', 'B', 'C']:
-        #         current_section = None
-        #         for row in sheet.iter_rows(min_row=3):
-        #             # 如果当前行的section不为空，更新current_section
-        #             if row[0].value is not None:
-        #                 current_section = row[0].value.strip()
-
-        #             # 使用current_section进行匹配
-        #             if current_section == target_section:
-        #                 product_name = row[1].value  # B列是机号
-        #                 if not product_name:  # 跳过空行
-        #                     continue
-        #                 # 转换为字符串进行比较
-        #                 normalized_product_name = normalize_product_name(
-        #                     product_name)
-        #                 normalized_update_name = normalize_product_name(
-        #                     update['product_name'])
-        #                 if normalized_product_name == normalized_update_name:
-        #                     col_idx = get_column_index(update['column'])
-        #                     row[col_idx].value = update['value']
-        #                     break
-
-        # # Save with optimization
-        # workbook.save(target_file)
-        # workbook.close()
+        logger.debug("抖音更新指令: %s", updates)
 
     except FileNotFoundError as e:
         logger.error(f"文件不存在: {e}")
@@ -79,11 +60,12 @@ def process_table_data() -> None:
         logger.error(f"处理过程中出现错误: {e}")
         raise
 
+
 def process_recharge_details() -> Dict[str, Any]:
     """Process 充值明细表格"""
     try:
         path = "tables/1.xlsx"
-        df = pd.read_excel(path, skiprows=2, usecols=['充值金额', '充值赠送', '付款方式'])
+        df = pd.read_excel(path, engine='calamine', skiprows=2, usecols=['充值金额', '充值赠送', '付款方式'])
         
         
         # 将充值金额和充值赠送的 NaN 值填充为 0
@@ -128,6 +110,7 @@ def process_time_statistics(path: Path) -> Dict[str, Any]:
         # 按第三列（C列）分组并处理数据
         df = pd.read_excel(
             path,
+            engine='calamine',
             skiprows=2,  # 跳过前两行
             usecols=[1, 2, 3],  # 只读取B、C、D列
             names=['机号', '油品', '加油升']
@@ -146,20 +129,12 @@ def process_time_statistics(path: Path) -> Dict[str, Any]:
             '95#汽油': 'C'
         }
 
-        # 构建更新指令
-        updates = []
-        for _, row in df.iterrows():
-            if pd.notna(row['加油升']):  # 只处理非空值
-                # 根据油品类型确定对应的区域
-                section = fuel_type_mapping.get(row['油品'])
-                if section:
-                    updates.append({
-                        'sheet': '调价前',
-                        'section': section,  # 添加区域信息
-                        'product_name': row['机号'],
-                        'column': 'D',  # D列
-                        'value': row['加油升']
-                    })
+        # 构建更新指令：只处理非空值和已知油品
+        rows = df.dropna(subset=['加油升']).assign(
+            section=lambda d: d['油品'].map(fuel_type_mapping))  # 根据油品类型确定对应的区域
+        rows = rows.dropna(subset=['section'])
+        updates = rows.rename(columns={'机号': 'product_name', '加油升': 'value'}).assign(
+            sheet='调价前', column='D')[['sheet', 'section', 'product_name', 'column', 'value']].to_dict(orient='records')
 
         return {
             'updates': updates,
@@ -171,13 +146,14 @@ def process_time_statistics(path: Path) -> Dict[str, Any]:
         raise
 
 
-def process_douyin(path: Path) -> Dict[str, Any]:
+def process_douyin(path: Path, start_datetime: datetime = _DOUYIN_START, end_datetime: datetime = _DOUYIN_END,
+                   gas_price: float = _DOUYIN_GAS_PRICE) -> Dict[str, Any]:
     """Process 抖音 table for voucher transactions.
 
     Args:
         path: Path to the Douyin transaction file
-        selected_work_start_time: Start time of the work period (only time part is used)
-        selected_shift_time: End time of the work period (only time part is used)
+        start_datetime: Start of the work period (inclusive)
+        end_datetime: End of the work period (inclusive)
         gas_price: Current gas price per unit
 
     Returns:
@@ -185,44 +161,40 @@ def process_douyin(path: Path) -> Dict[str, Any]:
     """
     try:
         df = pd.read_excel(
-            path, usecols=['核销时间', '商品名称', '实际核销数量', '订单实收', '商家应得'])
+            path, engine='calamine', usecols=['核销时间', '商品名称', '实际核销数量', '订单实收', '商家应得'],
+            dtype={'商品名称': 'category'},  # 商品名称只有少数几种取值
+            parse_dates=['核销时间'], date_format='%Y-%m-%d %H:%M:%S')
 
-        # Convert verification time strings to datetime
-        df['核销时间'] = pd.to_datetime(df['核销时间'])
-
-        start_datetime = datetime.strptime(
-            "2025-02-05 08:00:00", "%Y-%m-%d %H:%M:%S")
-        end_datetime = datetime.strptime(
-            "2025-02-06 08:00:00", "%Y-%m-%d %H:%M:%S")
-
-        gas_price = 7.25
+        # 读取时未能解析为日期的核销时间再单独转换
+        if not is_datetime64_any_dtype(df['核销时间']):
+            df['核销时间'] = pd.to_datetime(df['核销时间'])
 
         # 直接使用完整的datetime进行比较，处理跨天的情况
-        mask = (df['核销时间'] >= start_datetime) & (df['核销时间'] <= end_datetime)
-
-        filtered_df = df[mask]
+        times = df['核销时间']
+        if times.is_monotonic_increasing:
+            # 导出文件按核销时间排序时，二分查找直接切出时间窗口
+            lo = times.searchsorted(start_datetime, side='left')
+            hi = times.searchsorted(end_datetime, side='right')
+            filtered_df = df.iloc[lo:hi]
+        else:
+            filtered_df = df[(times >= start_datetime) & (times <= end_datetime)]
 
         # Extract voucher amounts and calculate total value
-        def extract_voucher_amount(product_name: str) -> float:
-            try:
-                # Extract the number before "元" from strings like "【春节不打烊】186代200元汽油代金券"
-                amount = float(
-                    ''.join(filter(str.isdigit, product_name.split('元')[0][-4:])))
-                print(amount)
-                return amount
-            except Exception:
-                logger.warning(
-                    f"Could not extract voucher amount from: {product_name}")
-                return 0.0
-
-        filtered_df['voucher_amount'] = filtered_df['商品名称'].apply(
-            extract_voucher_amount)
-        total_voucher_value = (
-            filtered_df['voucher_amount'] * filtered_df['实际核销数量']).sum()
-
-        # Calculate required metrics
-        total_received = filtered_df['订单实收'].sum()
-        total_merchant_revenue = filtered_df['商家应得'].sum()
+        # 从 "【春节不打烊】186代200元汽油代金券" 这类名称中提取 "元" 前的面额，
+        # 每种商品名称只解析一次，再按类别编码查表；末尾的 0 对应空名称（编码 -1）
+        names = filtered_df['商品名称']
+        amount_by_code = np.append(pd.to_numeric(
+            names.cat.categories.astype(str).str.extract(_VOUCHER_RE, expand=False),
+            errors='coerce').fillna(0.0).to_numpy(dtype=np.float64), 0.0)
+        voucher_amount = amount_by_code[names.cat.codes.to_numpy()]
+        # 空的核销数量按 0 计，与 pandas sum() 跳过 NaN 一致
+        total_voucher_value = float(np.dot(
+            voucher_amount,
+            filtered_df['实际核销数量'].fillna(0).to_numpy(dtype=np.float64)))
+
+        # Calculate required metrics: 两列金额在一次归约中求和，空单元格跳过
+        total_received, total_merchant_revenue = np.nansum(filtered_df[['订单实收', '商家应得']].to_numpy(
+            dtype=np.float64), axis=0).tolist()
         total_discount = total_voucher_value - total_received
         handling_fee = total_received - total_merchant_revenue
         gas_quantity = total_voucher_value / \
@@ -267,13 +239,8 @@ def process_douyin(path: Path) -> Dict[str, Any]:
 
 def extract_voucher_amount(product_name: str) -> float:
     # Extract the number before "元" from strings like "【春节不打烊】186代200元汽油代金券（XXXX）"
-    print(product_name.split('元')[0][-4:])
-    match = re.search(r'(\d+)元', product_name)
-    if match:
-        amount = float(match.group(1))
-        return amount
-    else:
-        return 0.0
+    match = _VOUCHER_RE.search(product_name)
+    return float(match.group(1)) if match else 0.0
 
 def get_column_index(column: str) -> int:
     """
@@ -286,12 +253,17 @@ def get_column_index(column: str) -> int:
     Returns:
         Zero-based column index
     """
+    column = column.upper()
+    index = _COL_INDEX.get(column)
+    if index is not None:
+        return index
     result = 0
-    for char in column.upper():
+    for char in column:
         result = result * 26 + (ord(char) - ord('A') + 1)
     return result - 1  # Convert to 0-based index
 
 
+@lru_cache(maxsize=4096, typed=True)
 def normalize_product_name(name: str) -> str:
     """
     Normalize product name (油枪序号) to a standard format.
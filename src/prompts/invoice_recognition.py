@@ -1,4 +1,5 @@
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 
 INVOICE_SYSTEM_PROMPT = """You are an AI assistant specialized in analyzing gas station management system data and reports. You should:
 
@@ -104,6 +105,12 @@ INVOICE_IMAGE_PROMPT = """请分析加油站系统截图并提取数据。图片
 请严格按照 schema 定义的字段返回数据，保留原始数值和单位。无法识别的字段使用 null。
 """
 
+# Required response fields per category, derived once from the schemas
+_REQUIRED_FIELDS: Dict[str, frozenset] = {
+    category: frozenset(schema.get("required", ()))
+    for category, schema in CATEGORY_SCHEMAS.items()
+}
+
 
 def get_category_schema(category: str) -> Optional[Dict[str, Any]]:
     """
@@ -118,6 +125,42 @@ def get_category_schema(category: str) -> Optional[Dict[str, Any]]:
     return CATEGORY_SCHEMAS.get(category)
 
 
+def get_missing_fields(category: str, data: Dict[str, Any]) -> List[str]:
+    """
+    Get the required schema fields absent from a recognition result.
+
+    Args:
+        category: The category of the image
+        data: Parsed recognition result
+
+    Returns:
+        Missing field names in schema order; empty if all are present
+    """
+    required = _REQUIRED_FIELDS.get(category)
+    if not required or required <= data.keys():
+        return []
+    return [field for field in CATEGORY_SCHEMAS[category]["required"] if field not in data]
+
+
+@lru_cache(maxsize=None)
+def get_prompt_template(category: str) -> Tuple[str, str]:
+    """
+    Get the image prompt for a category, split around the image name.
+
+    Args:
+        category: The category of the image
+
+    Returns:
+        Tuple of the prompt text before and after the image name
+    """
+    prefix, _, suffix = INVOICE_IMAGE_PROMPT.replace(
+        "{category}", category
+    ).replace(
+        "{category_specific_prompt}", CATEGORY_PROMPTS.get(category, "")
+    ).partition("{image_name}")
+    return prefix, suffix
+
+
 def get_invoice_recognition_messages(category: str, image_name: str) -> list[Dict[str, Any]]:
     """
     Generate messages for invoice recognition.
@@ -129,12 +172,8 @@ def get_invoice_recognition_messages(category: str, image_name: str) -> list[Dic
     Returns:
         List of message dictionaries for the API
     """
-    category_prompt = CATEGORY_PROMPTS.get(category, "")
-    prompt = INVOICE_IMAGE_PROMPT.format(
-        image_name=image_name,
-        category=category,
-        category_specific_prompt=category_prompt
-    )
+    prefix, suffix = get_prompt_template(category)
+    prompt = prefix + image_name + suffix
 
     return [
         {"role": "system", "content": INVOICE_SYSTEM_PROMPT},
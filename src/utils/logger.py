@@ -5,6 +5,8 @@ from src.utils.app_paths import get_log_file_path
 
 settings = get_settings()
 
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
+
 
 def get_log_path():
     """Get the appropriate log file path for both development and packaged environments"""
@@ -15,13 +17,14 @@ def setup_logger():
     """Configure logging settings"""
     # Remove default handler
     logger.remove()
+    level = settings.LOG_LEVEL.upper()
 
     try:
         # Add console handler
         logger.add(
             sys.stdout,
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
-            level=settings.LOG_LEVEL,
+            format=LOG_FORMAT,
+            level=level,
             colorize=True
         )
 
@@ -31,9 +34,14 @@ def setup_logger():
             log_file,
             rotation="500 MB",
             retention="7 days",
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
-            level=settings.LOG_LEVEL,
-            catch=True  # Catch exceptions that occur during logging
+            format=LOG_FORMAT,
+            level=level,
+            catch=True,  # Catch exceptions that occur during logging
+            # Write from a background thread so callers never wait on disk I/O
+            # or rotation; skip the costly variable dumps in tracebacks
+            enqueue=True,
+            backtrace=False,
+            diagnose=False
         )
     except Exception as e:
         # Fallback to console-only logging if file logging fails
@@ -76,8 +76,22 @@ def test_parse_numeric_value_with_complex_strings():
         ("25,378.75", None, 25378.75),
         ("25,378.75元", "元", 25378.75),
         ("2,225,378.75元", "元", 2225378.75),
+        ("结算金额 131.45 元，服务费 1.60 元", "元", 131.45),
+        ("加油升数: 升 35.71", "升", 35.71),
     ]
 
     for test_input, unit, expected in test_cases:
         result = parse_numeric_value(test_input, unit=unit)
         assert result == expected, f"Failed to parse complex string: '{test_input}'"
+
+
+def test_parse_numeric_value_plain_number_strings():
+    """Test parse_numeric_value with strings that are already plain numbers."""
+    assert parse_numeric_value("123.45") == 123.45
+    assert parse_numeric_value(" -25,378.75 ") == -25378.75
+    assert parse_numeric_value("35.71", unit="升") == 35.71
+
+    # Forms float() accepts but the parser does not treat as plain numbers
+    assert parse_numeric_value("nan") == 0.0
+    assert parse_numeric_value("1e5") == 1.0
+    assert parse_numeric_value("1_000") == 1.0
@@ -3,6 +3,9 @@
 from PySide6.QtCore import QSettings
 from src.gui.styles import LIGHT_THEME, DARK_THEME
 
+# Stylesheet for each theme; unknown themes fall back to the light one
+_THEME_STYLES = {'light': LIGHT_THEME, 'dark': DARK_THEME}
+
 
 class ThemeManager:
     """Manages application theme settings and provides theme-related utilities."""
@@ -10,6 +13,8 @@ class ThemeManager:
     def __init__(self):
         """Initialize the theme manager with application settings."""
         self.settings = QSettings('YourCompany', 'InvoiceProcessor')
+        # QSettings is backed by the registry or a file, so read it only once
+        self._theme_cache = self.settings.value('theme', 'light')
 
     def get_current_theme(self) -> str:
         """
@@ -18,7 +23,7 @@ class ThemeManager:
         Returns:
             str: The current theme ('light' or 'dark')
         """
-        return self.settings.value('theme', 'light')
+        return self._theme_cache
 
     def set_theme(self, theme: str) -> None:
         """
@@ -27,6 +32,7 @@ class ThemeManager:
         Args:
             theme (str): The theme to set ('light' or 'dark')
         """
+        self._theme_cache = theme
         self.settings.setValue('theme', theme)
 
     def get_theme_style(self) -> str:
@@ -36,5 +42,4 @@ class ThemeManager:
         Returns:
             str: The stylesheet for the current theme
         """
-        theme = self.get_current_theme()
-        return DARK_THEME if theme == 'dark' else LIGHT_THEME
+        return _THEME_STYLES.get(self._theme_cache, LIGHT_THEME)
@@ -1,7 +1,13 @@
 from typing import Union, Optional
+from functools import lru_cache
 import re
 from .logger import logger
 
+# Signed number with optional thousands separators and decimals
+_NUM_RE = re.compile(r'[-+]?[\d,]*\.?\d+')
+# Spaces and currency symbols dropped before the general number search
+_STRIP_TABLE = str.maketrans('', '', ' ¥$')
+
 
 def parse_numeric_value(
     value: Union[float, str],
@@ -37,42 +43,9 @@ def parse_numeric_value(
 
         # If value is string, clean and parse it
         if isinstance(value, str):
-            # Remove all spaces and common currency symbols
-            cleaned_value = value.strip()
-
-            if unit:
-                # Try to find number near the unit first
-                # Split the string into segments that end with the unit
-                segments = cleaned_value.split(unit)
-                if len(segments) > 1:  # If unit is found in string
-                    # Don't process the last segment after split
-                    for i in range(len(segments)-1):
-                        # Look for numbers in the current segment and at the start of next segment
-                        current_segment = segments[i]
-                        next_segment = segments[i+1]
-
-                        # Try to find number at the end of current segment
-                        numbers = re.findall(
-                            r'[-+]?[\d,]*\.?\d+', current_segment)
-                        if numbers:
-                            # Take the last number before unit and remove commas
-                            return float(numbers[-1].replace(",", ""))
-
-                        # If no number in current segment, check start of next segment
-                        numbers = re.findall(
-                            r'[-+]?[\d,]*\.?\d+', next_segment)
-                        if numbers:
-                            # Take the first number after unit and remove commas
-                            return float(numbers[0].replace(",", ""))
-
-            # Remove spaces and currency symbols for general number search
-            cleaned_value = cleaned_value.replace(
-                " ", "").replace("¥", "").replace("$", "")
-
-            # If no unit provided or unit not found, try to extract any number
-            number_match = re.search(r'[-+]?[\d,]*\.?\d+', cleaned_value)
-            if number_match:
-                return float(number_match.group().replace(",", ""))
+            parsed = _parse_numeric_string(value, unit)
+            if parsed is not None:
+                return parsed
 
         # If parsing fails, log warning and return default
         logger.warning(
@@ -82,3 +55,59 @@ def parse_numeric_value(
     except Exception as e:
         logger.error(f"Error parsing numeric value '{value}': {str(e)}")
         return default_value
+
+
+@lru_cache(maxsize=1024)
+def _parse_numeric_string(value: str, unit: Optional[str]) -> Optional[float]:
+    """
+    Extract a number from a string, memoized on (value, unit).
+
+    Args:
+        value: The string to parse
+        unit: Optional unit the number should be adjacent to
+
+    Returns:
+        Parsed float value, or None if the string contains no number
+    """
+    # Remove all spaces and common currency symbols
+    cleaned_value = value.strip()
+
+    # Fast path for plain numbers such as "123.45" or "25,378.75"; strings with
+    # letters or underscores are left to the regex so float() never accepts
+    # forms like "nan", "1e5" or "1_000"
+    if cleaned_value.isascii() and not any(c.isalpha() or c == '_' for c in cleaned_value):
+        try:
+            return float(cleaned_value.replace(",", ""))
+        except ValueError:
+            pass
+
+    if unit:
+        # First number written directly before or after the unit (spaces allowed)
+        match = _unit_re(unit).search(cleaned_value)
+        if match:
+            return float((match.group(1) or match.group(2)).replace(",", ""))
+
+    # Remove spaces and currency symbols for general number search
+    cleaned_value = cleaned_value.translate(_STRIP_TABLE)
+
+    # If no unit provided or unit not found, try to extract any number
+    number_match = _NUM_RE.search(cleaned_value)
+    if number_match:
+        return float(number_match.group().replace(",", ""))
+    return None
+
+
+@lru_cache(maxsize=None)
+def _unit_re(unit: str) -> re.Pattern:
+    """
+    Compile the pattern matching a number adjacent to a unit, once per unit.
+
+    Args:
+        unit: Unit the number should be adjacent to
+
+    Returns:
+        Pattern capturing the number before (group 1) or after (group 2) the unit
+    """
+    number = _NUM_RE.pattern
+    escaped = re.escape(unit)
+    return re.compile(rf'({number})\s*{escaped}|{escaped}\s*({number})')